@@ -7,7 +7,8 @@ from dotenv import load_dotenv
 
 # Загружаем .env
 load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
+# bench/seed.py и тесты передают URL scratch-базы через config.attributes
+DATABASE_URL = context.config.attributes.get("database_url") or os.getenv("DATABASE_URL")
 
 # Отключаем логгер, чтобы не было ошибок
 # fileConfig(context.config.config_file_name)
@@ -0,0 +1,30 @@
+"""Add purchased_slots.complete_at
+
+Revision ID: 3c1f8e2a9d47
+Revises: b84960ec9c06
+Create Date: 2026-10-18 10:12:41.305118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1f8e2a9d47'
+down_revision: Union[str, Sequence[str], None] = 'b84960ec9c06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('purchased_slots', sa.Column('complete_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_purchased_slots_complete_at', 'purchased_slots', ['complete_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_purchased_slots_complete_at', table_name='purchased_slots')
+    op.drop_column('purchased_slots', 'complete_at')
@@ -0,0 +1,59 @@
+"""Add composite and partial indexes for hot user_slots / purchased_slots queries
+
+Revision ID: 5e7a0c4b8f12
+Revises: 3c1f8e2a9d47
+Create Date: 2026-10-18 11:02:17.640231
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e7a0c4b8f12'
+down_revision: Union[str, Sequence[str], None] = '3c1f8e2a9d47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY нельзя внутри транзакции — таблицы в проде не блокируются на запись
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_slots_user_status_slot', 'user_slots', ['user_id', 'status', 'slot_id'],
+            unique=False, postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_user_slots_user_slot', 'user_slots', ['user_id', 'slot_id'],
+            unique=False, postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_purchased_slots_active_type_created', 'purchased_slots', ['slot_type', 'created_at'],
+            unique=False, postgresql_where=sa.text("status = 'active'"), postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_purchased_slots_completing_due', 'purchased_slots', ['complete_at'],
+            unique=False, postgresql_where=sa.text("status = 'completing'"), postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_purchased_slots_advertiser_created', 'purchased_slots', ['advertiser_id', 'created_at'],
+            unique=False, postgresql_concurrently=True
+        )
+        # покрыты составными индексами выше
+        op.drop_index('ix_user_slots_user_id', table_name='user_slots', postgresql_concurrently=True)
+        op.drop_index('ix_purchased_slots_complete_at', table_name='purchased_slots', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index('ix_purchased_slots_complete_at', 'purchased_slots', ['complete_at'], unique=False)
+        op.create_index('ix_user_slots_user_id', 'user_slots', ['user_id'], unique=False)
+        op.drop_index('ix_purchased_slots_advertiser_created', table_name='purchased_slots')
+        op.drop_index('ix_purchased_slots_completing_due', table_name='purchased_slots')
+        op.drop_index('ix_purchased_slots_active_type_created', table_name='purchased_slots')
+        op.drop_index('ix_user_slots_user_slot', table_name='user_slots')
+        op.drop_index('ix_user_slots_user_status_slot', table_name='user_slots')
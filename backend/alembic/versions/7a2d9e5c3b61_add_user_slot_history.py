@@ -0,0 +1,45 @@
+"""Add user_slot_history and the partial index used by the compactor
+
+Revision ID: 7a2d9e5c3b61
+Revises: 5e7a0c4b8f12
+Create Date: 2026-10-18 14:26:51.118402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a2d9e5c3b61'
+down_revision: Union[str, Sequence[str], None] = '5e7a0c4b8f12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'user_slot_history',
+        sa.Column('id', sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=True),
+        sa.Column('slot_id', sa.Integer(), nullable=True),
+        sa.Column('subscribed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_user_slot_history_user_id'), 'user_slot_history', ['user_id'], unique=False)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_slots_completed', 'user_slots', ['id'],
+            unique=False, postgresql_where=sa.text("status = 'completed'"), postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_user_slots_completed', table_name='user_slots')
+    op.drop_index(op.f('ix_user_slot_history_user_id'), table_name='user_slot_history')
+    op.drop_table('user_slot_history')
@@ -0,0 +1,34 @@
+"""Backfill timer_started_at for timers left running by the old client
+
+Revision ID: 8b3e1f6a2c94
+Revises: 7a2d9e5c3b61
+Create Date: 2026-10-18 10:12:40.502113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b3e1f6a2c94'
+down_revision: Union[str, Sequence[str], None] = '7a2d9e5c3b61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Старый клиент писал timer_running без timer_started_at; evaluate_timer считает от
+    # timer_started_at, поэтому такие таймеры стояли бы на timer_progress. Отсчёт — с момента миграции.
+    op.execute(sa.text(
+        "UPDATE users SET timer_started_at = CURRENT_TIMESTAMP "
+        "WHERE timer_running AND timer_started_at IS NULL"
+    ))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # данные не откатываются: timer_started_at для running-таймеров корректен и в старой схеме
+    pass
@@ -0,0 +1,44 @@
+"""Make (user_id, slot_id) unique in user_slots
+
+Revision ID: 9c4f2b7e1d05
+Revises: 8b3e1f6a2c94
+Create Date: 2026-10-18 14:36:08.117942
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4f2b7e1d05'
+down_revision: Union[str, Sequence[str], None] = '8b3e1f6a2c94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # дубли от гонки BatchAllocator и /api/user_slots: оставляем самую раннюю строку пары
+    op.execute(
+        "DELETE FROM user_slots a USING user_slots b "
+        "WHERE a.user_id = b.user_id AND a.slot_id = b.slot_id AND a.id > b.id"
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'uq_user_slots_user_slot', 'user_slots', ['user_id', 'slot_id'],
+            unique=True, postgresql_concurrently=True
+        )
+        # уникальный индекс покрывает те же запросы
+        op.drop_index('ix_user_slots_user_slot', table_name='user_slots', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_slots_user_slot', 'user_slots', ['user_id', 'slot_id'],
+            unique=False, postgresql_concurrently=True
+        )
+        op.drop_index('uq_user_slots_user_slot', table_name='user_slots', postgresql_concurrently=True)
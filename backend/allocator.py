@@ -0,0 +1,152 @@
+# backend/allocator.py
+import os
+import logging
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from events import event_bus
+from inventory import slot_inventory, VIP, STANDARD
+from queries import (
+    lock_users_stmt, slot_deficits_stmt, allocation_slots_stmt, held_pairs_stmt, subscribed_pairs_stmt,
+    insert_user_slots_stmt
+)
+from background import BackgroundLoop
+import metrics
+
+logger = logging.getLogger(__name__)
+
+ALLOC_MAX_USERS = int(os.getenv("ALLOC_MAX_USERS", "5000"))  # пользователей за один проход
+ALLOC_CANDIDATES = int(os.getenv("ALLOC_CANDIDATES", "2000"))  # слотов-кандидатов за проход
+
+
+class BatchAllocator(BackgroundLoop):
+    """Массовое дозаполнение ячеек одним проходом по матрице пользователи × слоты.
+
+    Когда завершается крупный слот, тысячи держателей теряют по ячейке одновременно.
+    Вместо того чтобы каждый из них подбирал слот на своём следующем poll, сюда
+    попадает весь список: матрица допустимости строится из трёх запросов пачкой,
+    слоты раздаются VIP-первыми с учётом оставшихся показов (required_shows -
+    current_shows), результат пишется одним bulk INSERT.
+
+    Недобор считается под FOR UPDATE строк users — той же блокировкой, что берёт
+    /api/user_slots, поэтому оба пути не дозаполняют одного пользователя одновременно.
+    """
+
+    def __init__(self, session_factory, max_users: int = ALLOC_MAX_USERS, candidates: int = ALLOC_CANDIDATES):
+        super().__init__()
+        self._session_factory = session_factory
+        self.max_users = max_users
+        self.candidates = candidates
+        self._pending: Set[int] = set()
+        self._rng = np.random.default_rng()
+
+    def schedule(self, user_ids: Iterable[int]) -> None:
+        self._pending.update(user_ids)
+        if self._pending:
+            self.wake()
+
+    def _candidate_ids(self) -> List[int]:
+        picked = slot_inventory.sample(VIP, self.candidates, exclude=set())
+        if len(picked) < self.candidates:
+            picked += slot_inventory.sample(STANDARD, self.candidates - len(picked), exclude=set())
+        return picked
+
+    async def allocate(self, db: AsyncSession, user_ids: Iterable[int]) -> Dict[int, List[int]]:
+        """Назначить слоты пользователям с недобором ячеек; вернуть user_id -> новые slot_id."""
+        await db.execute(lock_users_stmt(user_ids))
+        res = await db.execute(slot_deficits_stmt(user_ids))
+        users: List[int] = []
+        deficits: List[int] = []
+        for user_id, slot_count, visible in res.all():
+            if (slot_count or 0) > visible:
+                users.append(user_id)
+                deficits.append(slot_count - visible)
+        if not users:
+            return {}
+
+        await slot_inventory.ensure_loaded(db)
+        candidate_ids = self._candidate_ids()
+        if not candidate_ids:
+            return {}
+        slots = (await db.execute(allocation_slots_stmt(candidate_ids))).all()
+        # VIP первыми, внутри типа — FIFO по id
+        slots.sort(key=lambda s: (s.slot_type != VIP, s.id))
+        if not slots:
+            return {}
+
+        user_index = {user_id: i for i, user_id in enumerate(users)}
+        slot_index = {s.id: j for j, s in enumerate(slots)}
+        channel_index: Dict[Optional[str], int] = {}
+        channel_codes = np.array(
+            [channel_index.setdefault(s.channel_username, len(channel_index)) for s in slots], dtype=np.int64
+        )
+        capacity = np.array([max((s.required_shows or 0) - (s.current_shows or 0), 0) for s in slots], dtype=np.int64)
+        deficit = np.array(deficits, dtype=np.int64)
+
+        eligible = np.ones((len(users), len(slots)), dtype=bool)
+        held = (await db.execute(held_pairs_stmt(users, list(slot_index)))).all()
+        if held:
+            rows, cols = np.array([(user_index[u], slot_index[s]) for u, s in held], dtype=np.int64).T
+            eligible[rows, cols] = False
+        channels = [c for c in channel_index if c is not None]
+        subscribed = (await db.execute(subscribed_pairs_stmt(users, channels))).all() if channels else []
+        if subscribed:
+            # пользователи × каналы, затем разворачиваем на колонки слотов по коду канала
+            user_channel = np.zeros((len(users), len(channel_index)), dtype=bool)
+            rows, cols = np.array([(user_index[u], channel_index[c]) for u, c in subscribed], dtype=np.int64).T
+            user_channel[rows, cols] = True
+            eligible &= ~user_channel[:, channel_codes]
+
+        # случайный порядок пользователей: при нехватке слотов никто не обделён систематически
+        order = self._rng.permutation(len(users))
+        assigned = np.zeros_like(eligible)
+        for j in range(len(slots)):
+            if capacity[j] <= 0:
+                continue
+            chosen = order[eligible[order, j] & (deficit[order] > 0)][:capacity[j]]
+            if not chosen.size:
+                continue
+            assigned[chosen, j] = True
+            deficit[chosen] -= 1
+            capacity[j] -= chosen.size
+            # один канал — не больше одного слота на пользователя
+            eligible[np.ix_(chosen, np.flatnonzero(channel_codes == channel_codes[j]))] = False
+            if not deficit.any():
+                break
+
+        rows, cols = np.nonzero(assigned)
+        if not rows.size:
+            return {}
+        res = await db.execute(insert_user_slots_stmt(
+            db.get_bind().dialect.name,
+            [{"user_id": users[i], "slot_id": slots[j].id, "status": "active"}
+             for i, j in zip(rows.tolist(), cols.tolist())]
+        ))
+        result: Dict[int, List[int]] = {}
+        for user_id, slot_id in res.all():
+            result.setdefault(user_id, []).append(slot_id)
+        return result
+
+    async def flush(self) -> int:
+        batch = list(self._pending)[:self.max_users]
+        self._pending.difference_update(batch)
+        if not batch:
+            return 0
+        try:
+            async with self._session_factory() as db:
+                result = await self.allocate(db, batch)
+                await db.commit()
+        except Exception:
+            # не критично: эти пользователи доберут слоты обычным путём на следующем /api/user_slots
+            logger.exception("Batch allocation failed for %s users", len(batch))
+            return 0
+        assigned = sum(len(slot_ids) for slot_ids in result.values())
+        metrics.slot_assignments.inc(assigned)
+        event_bus.publish_many(result, {"type": "slots", "reason": "assigned"})
+        logger.info("Batch allocator assigned %s slots to %s users", assigned, len(result))
+        return len(batch)
+
+    async def step(self) -> bool:
+        return bool(await self.flush())
@@ -0,0 +1,120 @@
+# backend/assets.py
+import gzip
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # без brotli отдаём gzip — браузеры Telegram поддерживают оба
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = Path(__file__).parent / "static"
+FINGERPRINTED = ("script.js", "style.css")
+ASSETS_PREFIX = "/assets"
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"  # index.html всегда перепроверяется по ETag — иначе не подхватятся новые хэши
+
+# у каждой кодировки свои байты — и свой сильный ETag, иначе кэш/прокси отдаст gzip по ETag identity
+ETAG_SUFFIXES = {"identity": "", "gzip": "-gz", "br": "-br"}
+
+CONTENT_TYPES = {
+    ".js": "application/javascript; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".html": "text/html; charset=utf-8",
+}
+
+
+class Asset(NamedTuple):
+    content_type: str
+    etags: Dict[str, str]  # по кодировке, как и bodies
+    bodies: Dict[str, bytes]  # "identity" / "gzip" / "br"
+
+
+def _build_asset(content: bytes, content_type: str, digest: str) -> Asset:
+    bodies = {"identity": content, "gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        bodies["br"] = brotli.compress(content, quality=11)
+    etags = {encoding: f'"{digest}{ETAG_SUFFIXES[encoding]}"' for encoding in bodies}
+    return Asset(content_type, etags, bodies)
+
+
+def _pick_encoding(request: Request, asset: Asset) -> str:
+    accepted = {part.split(";")[0].strip() for part in request.headers.get("accept-encoding", "").split(",")}
+    for encoding in ("br", "gzip"):
+        if encoding in accepted and encoding in asset.bodies:
+            return encoding
+    return "identity"
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in {part.strip() for part in header.split(",")}
+
+
+class AssetPipeline:
+    """Сборка статики при старте: хэш в имени файла, заранее сжатые gzip/brotli версии, index.html в памяти.
+
+    script.js и style.css отдаются как /assets/<name>.<hash>.<ext> с immutable-кэшем;
+    ссылки на них в index.html переписываются, сам index.html кэшируется клиентом только по ETag.
+    """
+
+    def __init__(self, static_dir: Path = STATIC_DIR):
+        self.static_dir = static_dir
+        self._assets: Dict[str, Asset] = {}
+        self._index: Optional[Asset] = None
+        self.urls: Dict[str, str] = {}
+
+    def build(self) -> None:
+        assets: Dict[str, Asset] = {}
+        urls: Dict[str, str] = {}
+        for name in FINGERPRINTED:
+            path = self.static_dir / name
+            content = path.read_bytes()
+            digest = hashlib.sha256(content).hexdigest()[:12]
+            fingerprinted = f"{path.stem}.{digest}{path.suffix}"
+            assets[fingerprinted] = _build_asset(content, CONTENT_TYPES[path.suffix], digest)
+            urls[name] = f"{ASSETS_PREFIX}/{fingerprinted}"
+
+        html = (self.static_dir / "index.html").read_text(encoding="utf-8")
+        for name, url in urls.items():
+            html = html.replace(f"/static/{name}", url)
+        index = html.encode("utf-8")
+
+        self._assets, self.urls = assets, urls
+        self._index = _build_asset(index, CONTENT_TYPES[".html"], hashlib.sha256(index).hexdigest()[:16])
+        logger.info("Static assets built: %s (brotli=%s)", ", ".join(urls.values()), brotli is not None)
+
+    def _respond(self, request: Request, asset: Asset, cache_control: str) -> Response:
+        encoding = _pick_encoding(request, asset)
+        headers = {"ETag": asset.etags[encoding], "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        if _etag_matches(request, asset.etags[encoding]):
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(asset.bodies[encoding], media_type=asset.content_type, headers=headers)
+
+    def index_response(self, request: Request) -> Response:
+        if self._index is None:
+            self.build()
+        return self._respond(request, self._index, REVALIDATE)
+
+    def asset_response(self, request: Request, name: str) -> Optional[Response]:
+        if self._index is None:
+            self.build()
+        asset = self._assets.get(name)
+        if asset is None:
+            return None
+        return self._respond(request, asset, IMMUTABLE)
+
+
+asset_pipeline = AssetPipeline()
@@ -1,31 +1,98 @@
+import os
+import json
+import time
 import hashlib
 import hmac
-from typing import Dict
+import urllib.parse
+from typing import Dict, NamedTuple, Optional
 import logging  # Для log
 
+from ttl_cache import NEVER, TTLCache
+
+logger = logging.getLogger(__name__)
+
+# ← TEMP FOR TEST: HMAC не проверяется, пока TELEGRAM_AUTH_BYPASS=1 (выключи после теста)
+TELEGRAM_AUTH_BYPASS = os.getenv("TELEGRAM_AUTH_BYPASS", "1") == "1"
+INITDATA_MAX_AGE = int(os.getenv("INITDATA_MAX_AGE", "86400"))  # секунды; 0 — без ограничения
+INITDATA_CACHE_SIZE = int(os.getenv("INITDATA_CACHE_SIZE", "10000"))
+
+
+class TelegramInitData(NamedTuple):
+    user: dict
+    auth_date: int
+
+    @property
+    def user_id(self) -> Optional[int]:
+        return self.user.get("id")
+
+
+def parse_initdata(init_data: str) -> Dict[str, str]:
+    return dict(urllib.parse.parse_qsl(init_data, keep_blank_values=True))
+
+
+class TelegramAuthenticator:
+    """Проверка X-Telegram-WebApp-InitData с предвычисленным ключом и LRU уже проверенных строк.
+
+    Повторные polling-запросы с той же initData не пересчитывают HMAC и не парсят JSON.
+    Записи живут до auth_date + INITDATA_MAX_AGE.
+    """
+
+    def __init__(self, bot_token: Optional[str], max_age: int = INITDATA_MAX_AGE,
+                 cache_size: int = INITDATA_CACHE_SIZE, bypass: bool = TELEGRAM_AUTH_BYPASS):
+        # secret_key = HMAC_SHA256("WebAppData", bot_token) — считается один раз на процесс
+        self._secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest() if bot_token else None
+        self.max_age = max_age
+        self.bypass = bypass
+        if bypass:
+            logger.warning("Bypassed HMAC for test (TELEGRAM_AUTH_BYPASS=1)")
+        # срок записи — по auth_date initData, поэтому часы — time.time, а не monotonic
+        self._cache: TTLCache[TelegramInitData] = TTLCache(cache_size, clock=time.time)
+
+    def _expired(self, auth_date: int, now: float) -> bool:
+        return bool(self.max_age) and auth_date + self.max_age < now
+
+    def verify(self, init_data: str) -> Optional[TelegramInitData]:
+        cached = self._cache.get(init_data)
+        if cached is not None:
+            return cached
+        now = time.time()
+
+        try:
+            parsed_data = parse_initdata(init_data)
+            hash_value = parsed_data.pop("hash", None)
+            if not hash_value:
+                return None
+
+            if not self.bypass:
+                if self._secret_key is None:
+                    return None
+                data_check_string = "\n".join(
+                    f"{k}={v}" for k, v in sorted(parsed_data.items())
+                )
+                calculated_hash = hmac.new(
+                    self._secret_key, data_check_string.encode(), hashlib.sha256
+                ).hexdigest()
+                if not hmac.compare_digest(calculated_hash, hash_value):
+                    return None
+
+            auth_date = int(parsed_data.get("auth_date") or 0)
+            if not self.bypass and self._expired(auth_date, now):
+                return None
+            user = json.loads(parsed_data["user"]) if parsed_data.get("user") else {}
+        except Exception:
+            return None
+
+        result = TelegramInitData(user, auth_date)
+        expires_at = NEVER if self.bypass or not self.max_age else auth_date + self.max_age
+        self._cache.put(init_data, result, expires_at=expires_at)
+        return result
+
+
+_authenticators: Dict[Optional[str], TelegramAuthenticator] = {}
+
+
 def verify_telegram_initdata(init_data: str, bot_token: str) -> bool:
-    try:
-        parsed_data: Dict[str, str] = {}
-        for item in init_data.split("&"):
-            if "=" in item:
-                key, value = item.split("=", 1)
-                parsed_data[key] = value
-
-        hash_value = parsed_data.pop("hash", None)
-        if not hash_value:
-            return False
-
-        data_check_string = "\n".join(
-            f"{k}={v}" for k, v in sorted(parsed_data.items())
-        )
-
-        secret_key = hashlib.sha256(bot_token.encode()).digest()
-        calculated_hash = hmac.new(
-            secret_key, data_check_string.encode(), hashlib.sha256
-        ).hexdigest()
-
-        # ← TEMP FOR TEST: Bypass HMAC (заменил return hmac на True, удали после теста)
-        logging.getLogger(__name__).info("Bypassed HMAC for test")
-        return True
-    except Exception:
-        return False
\ No newline at end of file
+    authenticator = _authenticators.get(bot_token)
+    if authenticator is None:
+        authenticator = _authenticators[bot_token] = TelegramAuthenticator(bot_token)
+    return authenticator.verify(init_data) is not None
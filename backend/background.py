@@ -0,0 +1,71 @@
+# backend/background.py
+import asyncio
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundLoop:
+    """Фоновая задача процесса: start()/stop() и цикл «дождаться интервала или wake() → step()».
+
+    step() возвращает True, если работа осталась (полная пачка) — тогда следующий
+    вызов сразу, без ожидания. interval=None — только по wake(). Ошибки step()
+    логируются, цикл продолжается. Начатый step() отмена в stop() не обрывает:
+    stop() дожидается его, затем вызывает drain() для финального сброса.
+    """
+
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = interval
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Optional[asyncio.Future] = None
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    async def step(self) -> bool:
+        raise NotImplementedError
+
+    async def drain(self) -> None:
+        """Вызывается из stop() после остановки цикла."""
+
+    async def _wait(self) -> None:
+        if self.interval is None:
+            await self._wakeup.wait()
+        else:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+        self._wakeup.clear()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                while True:
+                    self._inflight = asyncio.ensure_future(self.step())
+                    if not await asyncio.shield(self._inflight):
+                        break
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("%s step failed", type(self).__name__)
+            await self._wait()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._inflight is not None and not self._inflight.done():
+            await asyncio.wait([self._inflight])
+        self._inflight = None
+        await self.drain()
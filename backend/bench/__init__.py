@@ -0,0 +1,10 @@
+# backend/bench — нагрузочные и plan-regression прогоны, запускаются из backend/: python -m bench.<name>
+import os
+
+
+def scratch_database_url(env_name: str) -> str:
+    """URL берётся только из отдельной переменной, чтобы случайно не засеять рабочую БД."""
+    url = os.getenv(env_name)
+    if not url:
+        raise SystemExit(f"{env_name} is not set: point it at a scratch database, it will be truncated")
+    return url
@@ -0,0 +1,123 @@
+# backend/bench/seed.py
+# Наполнение scratch-базы реалистичными объёмами для bench/query_plans.py и bench/load.py
+import os
+import asyncio
+import random
+from pathlib import Path
+from typing import Optional
+from datetime import datetime, timedelta, timezone
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import insert, text
+
+from models import Base, User, PurchasedAdSlot, UserSlot, UserSubscribedChannel
+
+SEED_USERS = int(os.getenv("SEED_USERS", "20000"))
+SEED_SLOTS = int(os.getenv("SEED_SLOTS", "50000"))
+SEED_SLOTS_PER_USER = int(os.getenv("SEED_SLOTS_PER_USER", "8"))
+SEED_CHANNELS_PER_USER = int(os.getenv("SEED_CHANNELS_PER_USER", "10"))
+SEED_CHUNK = 5000
+
+SEED_TABLES = ("user_subscribed_channels", "user_slot_history", "user_slots", "purchased_slots", "users")
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+# До этой ревизии таблицы создавал create_all; complete_at, индексы горячих запросов,
+# user_slot_history и всё дальнейшее приходят только из миграций
+BASELINE_REVISION = "b84960ec9c06"
+
+
+def alembic_config(url: str) -> Config:
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("script_location", str(ALEMBIC_INI.parent / "alembic"))
+    config.attributes["database_url"] = url
+    return config
+
+
+def _migrate(url: str) -> None:
+    config = alembic_config(url)
+    # create_all уже создал и объекты миграций — откатываем их до базовой ревизии и накатываем
+    # заново: индексы в планах — ровно те, что создаёт `alembic upgrade head` в проде
+    command.stamp(config, "head", purge=True)
+    command.downgrade(config, BASELINE_REVISION)
+    command.upgrade(config, "head")
+
+
+async def migrate(engine) -> None:
+    """Пересоздать схему scratch-базы: create_all для базовых таблиц, затем цепочка миграций."""
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP SCHEMA public CASCADE"))
+        await conn.execute(text("CREATE SCHEMA public"))
+        await conn.run_sync(Base.metadata.create_all)
+    # env.py сам крутит asyncio.run — в отдельном потоке, вне текущего цикла
+    await asyncio.to_thread(_migrate, engine.url.render_as_string(hide_password=False))
+
+
+async def _insert_chunked(conn, table, rows):
+    for start in range(0, len(rows), SEED_CHUNK):
+        await conn.execute(insert(table), rows[start:start + SEED_CHUNK])
+
+
+async def seed(engine, users: int = SEED_USERS, slots: int = SEED_SLOTS,
+               slots_per_user: int = SEED_SLOTS_PER_USER, channels_per_user: int = SEED_CHANNELS_PER_USER,
+               rng: Optional[random.Random] = None) -> dict:
+    rng = rng or random.Random(42)
+    now = datetime.now(timezone.utc)
+
+    await migrate(engine)
+    async with engine.begin() as conn:
+
+        await _insert_chunked(conn, User.__table__, [
+            {
+                "id": 1_000_000 + i, "level": 1, "free_points": 0, "distributed_points": 0,
+                "ref_points": 0, "payout_bonus": 0, "balance": 0.0, "current_slot_count": 5,
+                "timer_speed_multiplier": 1.0, "payout_rate": 1.0, "timer_progress": 0.0,
+                "timer_running": False,
+            }
+            for i in range(users)
+        ])
+
+        slot_rows = []
+        for i in range(slots):
+            # завершённые кампании копятся, активных — малая доля таблицы
+            roll = rng.random()
+            status = "active" if roll < 0.1 else "completing" if roll < 0.12 else "completed"
+            required = rng.choice((10, 100, 1000))
+            slot_rows.append({
+                "advertiser_id": 1_000_000 + rng.randrange(users),
+                "channel_username": f"channel_{i}",
+                "channel_name": f"Channel {i}",
+                "link": f"https://t.me/channel_{i}",
+                "slot_type": "vip" if rng.random() < 0.1 else "standard",
+                "required_shows": required,
+                "current_shows": required if status != "active" else rng.randrange(required),
+                "price_paid": 0.0,
+                "status": status,
+                "complete_at": now + timedelta(seconds=rng.randrange(-60, 600)) if status == "completing" else None,
+                "created_at": now - timedelta(minutes=rng.randrange(60 * 24 * 30)),
+            })
+        await _insert_chunked(conn, PurchasedAdSlot.__table__, slot_rows)
+
+        user_slot_rows = []
+        channel_rows = []
+        for i in range(users):
+            user_id = 1_000_000 + i
+            for slot_id in rng.sample(range(1, slots + 1), min(slots_per_user, slots)):
+                user_slot_rows.append({
+                    "user_id": user_id,
+                    "slot_id": slot_id,
+                    "status": rng.choice(("active", "subscribed", "subscribed", "completing")),
+                })
+            for channel in rng.sample(range(slots), min(channels_per_user, slots)):
+                channel_rows.append({"user_id": user_id, "channel_username": f"channel_{channel}"})
+        await _insert_chunked(conn, UserSlot.__table__, user_slot_rows)
+        await _insert_chunked(conn, UserSubscribedChannel.__table__, channel_rows)
+        # свежая статистика — иначе планировщик оценивает таблицы как пустые
+        await conn.execute(text(f"ANALYZE {', '.join(SEED_TABLES)}"))
+
+    return {
+        "users": users,
+        "purchased_slots": slots,
+        "user_slots": len(user_slot_rows),
+        "user_subscribed_channels": len(channel_rows),
+    }
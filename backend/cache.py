@@ -0,0 +1,91 @@
+# backend/cache.py
+import os
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from models import User
+from queries import new_user_row, upsert_users_stmt
+from ttl_cache import TTLCache
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "10"))  # секунды; ограничивает рассинхрон между воркерами
+
+_USER_COLUMNS = tuple(column.key for column in User.__table__.columns)
+
+
+class UserCache:
+    """Read-through TTL/LRU кэш снимков строки users.
+
+    Хранятся словари значений колонок, а не ORM-объекты: каждый get() собирает
+    свежий экземпляр, так что запросы не делят между собой изменяемое состояние.
+    Снимок может отставать от БД на ttl, поэтому он только для чтения — запись
+    идёт от строки, перечитанной через get_for_update().
+    """
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self._snapshots: TTLCache[dict] = TTLCache(maxsize, ttl)
+
+    async def get(self, db: AsyncSession, user_id: int) -> Optional[User]:
+        """Пользователь для чтения: экземпляр не привязан к сессии, изменения в нём не сохраняются."""
+        snapshot = self._snapshots.get(user_id)
+        if snapshot is None:
+            user = await db.get(User, user_id)
+            if user is not None:
+                self.put(user)
+            return user
+        return self._instance(snapshot)
+
+    def _instance(self, snapshot: dict) -> User:
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return user
+
+    async def get_for_update(self, db: AsyncSession, user_id: int) -> Optional[User]:
+        """Строка из БД под SELECT ... FOR UPDATE — для изменений; кэш обновляется после commit через put()."""
+        res = await db.execute(
+            select(User).where(User.id == user_id).with_for_update().execution_options(populate_existing=True)
+        )
+        return res.scalar_one_or_none()
+
+    async def get_or_create(self, db: AsyncSession, user_id: int, **fields) -> Tuple[Optional[User], bool]:
+        """get(), а при отсутствии строки — вставка одним INSERT ... ON CONFLICT DO NOTHING RETURNING.
+
+        Второй элемент — создан ли пользователь этим вызовом. Гонка двух первых
+        открытий не даёт IntegrityError: проигравший получает пустой RETURNING и читает строку.
+        """
+        user = await self.get(db, user_id)
+        if user is not None:
+            return user, False
+        res = await db.execute(upsert_users_stmt(db.get_bind().dialect.name, [new_user_row(user_id, **fields)]))
+        row = res.mappings().first()
+        await db.commit()
+        if row is None:
+            return await self.get(db, user_id), False
+        snapshot = dict(row)
+        self._snapshots.put(user_id, snapshot)
+        return self._instance(snapshot), True
+
+    def put(self, user: User) -> None:
+        loaded = inspect(user).dict
+        # колонки, истёкшие после flush (например updated_at с onupdate), не кэшируем
+        self._snapshots.put(user.id, {key: loaded[key] for key in _USER_COLUMNS if key in loaded})
+
+    def update(self, user_id: int, fields: dict) -> None:
+        snapshot = self._snapshots.peek(user_id)
+        if snapshot is not None:
+            snapshot.update((key, value) for key, value in fields.items() if key in _USER_COLUMNS)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._snapshots
+
+    def invalidate(self, user_id: int) -> None:
+        self._snapshots.pop(user_id)
+
+    def stats(self) -> Dict[str, float]:
+        return self._snapshots.stats()
+
+
+user_cache = UserCache()
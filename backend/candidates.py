@@ -0,0 +1,209 @@
+# backend/candidates.py
+import os
+import time
+import logging
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from inventory import slot_inventory, VIP, STANDARD
+from exclusions import channel_exclusions
+from queries import eligible_slots_stmt
+from background import BackgroundLoop
+
+logger = logging.getLogger(__name__)
+
+CANDIDATE_QUEUE_DEPTH = int(os.getenv("CANDIDATE_QUEUE_DEPTH", "8"))  # слотов наготове на пользователя
+CANDIDATE_QUEUE_USERS = int(os.getenv("CANDIDATE_QUEUE_USERS", "10000"))  # активных пользователей с очередью
+CANDIDATE_REFILL_BATCH = int(os.getenv("CANDIDATE_REFILL_BATCH", "100"))  # пользователей на одну сессию
+# очередь, которую инвентарь не смог заполнить, повторно пополняется не чаще раза в это окно
+CANDIDATE_REFILL_COOLDOWN = float(os.getenv("CANDIDATE_REFILL_COOLDOWN", "30"))  # секунды
+
+ASSIGN_SAMPLE_MIN = 16
+ASSIGN_SAMPLE_MAX = int(os.getenv("ASSIGN_SAMPLE_MAX", "512"))  # потолок id в одном IN (...) при подборе
+
+
+class Candidate(NamedTuple):
+    id: int
+    channel_username: Optional[str]
+    channel_name: Optional[str]
+    link: Optional[str]
+    slot_type: Optional[str]
+
+
+async def pick_slots_for_user(db: AsyncSession, user_id: int, need: int, exclude: Iterable[int] = ()) -> List[Candidate]:
+    """Sample-and-filter по индексу инвентаря: VIP первыми, случайно внутри корзины.
+
+    БД проверяет только ограниченный набор кандидатов (по PK), а не всю таблицу слотов.
+    """
+    await slot_inventory.ensure_loaded(db)
+
+    picked: List[Candidate] = []
+    for bucket in (VIP, STANDARD):
+        tried = set(exclude)
+        sample_size = min(max(need * 4, ASSIGN_SAMPLE_MIN), ASSIGN_SAMPLE_MAX)
+        while len(picked) < need:
+            candidates = slot_inventory.sample(bucket, sample_size, exclude=tried)
+            if not candidates:
+                break
+            tried.update(candidates)
+            eligible_res = await db.execute(eligible_slots_stmt(user_id, candidates))
+            rows = eligible_res.scalars().all()
+            # Bloom-фильтр пользователя; в БД уходят только «возможно подписан»
+            subscribed = await channel_exclusions.subscribed_among(db, user_id, {s.channel_username for s in rows})
+            eligible = {
+                s.id: Candidate(s.id, s.channel_username, s.channel_name, s.link, s.slot_type)
+                for s in rows if s.channel_username not in subscribed
+            }
+            # порядок кандидатов уже случайный — сохраняем его
+            picked.extend(eligible[sid] for sid in candidates if sid in eligible)
+            del picked[need:]
+            # пользователь видел большую часть корзины — расширяем выборку, но не сверх потолка
+            sample_size = min(sample_size * 2, ASSIGN_SAMPLE_MAX)
+    return picked
+
+
+class CandidateQueues(BackgroundLoop):
+    """Per-user очередь следующих K подходящих слотов, которую пополняет фоновый воркер.
+
+    Дозаполнение ячеек в /api/user_slots сводится к pop из очереди; подбор по
+    инвентарю и проверка в БД уходят в воркер. Перед выдачей кандидат ещё раз
+    сверяется с инвентарём в памяти — слот мог завершиться, пока лежал в очереди.
+    """
+
+    def __init__(self, session_factory, depth: int = CANDIDATE_QUEUE_DEPTH, max_users: int = CANDIDATE_QUEUE_USERS,
+                 refill_batch: int = CANDIDATE_REFILL_BATCH, refill_cooldown: float = CANDIDATE_REFILL_COOLDOWN):
+        super().__init__()
+        self._session_factory = session_factory
+        self.depth = depth
+        self.max_users = max_users
+        self.refill_batch = refill_batch
+        self.refill_cooldown = refill_cooldown
+        self._queues: "OrderedDict[int, Deque[Candidate]]" = OrderedDict()
+        self._slot_users: Dict[int, Set[int]] = {}  # slot_id -> пользователи, у которых он в очереди
+        self._pending: Set[int] = set()
+        # user_id -> (длина очереди, время) после пополнения, упёршегося в нехватку инвентаря
+        self._short: Dict[int, Tuple[int, float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _unlink(self, user_id: int, candidate: Candidate) -> None:
+        users = self._slot_users.get(candidate.id)
+        if users is not None:
+            users.discard(user_id)
+            if not users:
+                del self._slot_users[candidate.id]
+
+    def _drop_user(self, user_id: int) -> None:
+        self._short.pop(user_id, None)
+        for candidate in self._queues.pop(user_id, ()):
+            self._unlink(user_id, candidate)
+
+    def take(self, user_id: int, need: int, exclude: Set[int]) -> List[Candidate]:
+        """До need кандидатов из очереди пользователя; после выдачи очередь ставится на пополнение."""
+        taken: List[Candidate] = []
+        queue = self._queues.get(user_id)
+        if queue is not None:
+            self._queues.move_to_end(user_id)
+            # без БД: ложноположительный ответ фильтра лишь пропустит один кандидат из очереди
+            subscribed = channel_exclusions.peek(user_id)
+            while queue and len(taken) < need:
+                candidate = queue.popleft()
+                self._unlink(user_id, candidate)
+                if candidate.id not in slot_inventory or candidate.id in exclude:
+                    continue
+                if subscribed is not None and candidate.channel_username in subscribed:
+                    continue
+                taken.append(candidate)
+        if len(taken) >= need:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.request_refill(user_id)
+        return taken
+
+    def request_refill(self, user_id: int) -> None:
+        queue = self._queues.get(user_id)
+        if queue is not None and len(queue) >= self.depth:
+            return
+        short = self._short.get(user_id)
+        if (short is not None and queue is not None and short[0] == len(queue)
+                and time.monotonic() - short[1] < self.refill_cooldown):
+            return  # прошлое пополнение не нашло слотов, а очередь с тех пор не менялась
+        self._pending.add(user_id)
+        self.wake()
+
+    def discard_slot(self, slot_id: int) -> None:
+        """Слот ушёл из инвентаря (completing/удалён) — убрать его из всех очередей."""
+        for user_id in self._slot_users.pop(slot_id, ()):
+            queue = self._queues.get(user_id)
+            if queue is None:
+                continue
+            remaining = [c for c in queue if c.id != slot_id]
+            queue.clear()
+            queue.extend(remaining)
+            self.request_refill(user_id)
+
+    def on_subscribed(self, user_id: int, channel_username: Optional[str]) -> None:
+        """Подписка на канал записана в user_subscribed_channels — остальные слоты этого канала больше не подходят."""
+        channel_exclusions.add(user_id, channel_username)
+        queue = self._queues.get(user_id)
+        if not queue:
+            return
+        dropped = [c for c in queue if c.channel_username == channel_username]
+        if not dropped:
+            return
+        for candidate in dropped:
+            self._unlink(user_id, candidate)
+        remaining = [c for c in queue if c.channel_username != channel_username]
+        queue.clear()
+        queue.extend(remaining)
+        self.request_refill(user_id)
+
+    async def _refill(self, db: AsyncSession, user_id: int) -> None:
+        queue = self._queues.get(user_id)
+        have = {c.id for c in queue} if queue else set()
+        need = self.depth - len(have)
+        if need <= 0:
+            self._short.pop(user_id, None)
+            return
+        # назначенные пользователю слоты отсекает eligible_slots_stmt, здесь — только уже стоящие в очереди
+        picked = await pick_slots_for_user(db, user_id, need, exclude=have)
+        if queue is None:
+            queue = self._queues[user_id] = deque()
+            while len(self._queues) > self.max_users:
+                self._drop_user(next(iter(self._queues)))
+        for candidate in picked:
+            queue.append(candidate)
+            self._slot_users.setdefault(candidate.id, set()).add(user_id)
+        if len(queue) < self.depth:
+            self._short[user_id] = (len(queue), time.monotonic())
+        else:
+            self._short.pop(user_id, None)
+
+    async def refill(self) -> int:
+        users = list(self._pending)[:self.refill_batch]
+        self._pending.difference_update(users)
+        if not users:
+            return 0
+        try:
+            async with self._session_factory() as db:
+                for user_id in users:
+                    await self._refill(db, user_id)
+        except Exception:
+            logger.exception("Candidate queue refill failed for %s users", len(users))
+        return len(users)
+
+    async def step(self) -> bool:
+        return bool(await self.refill())
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._queues),
+            "pending_refill": len(self._pending),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,168 @@
+# backend/counters.py
+import os
+import time
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import update, select, case
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import PurchasedAdSlot, UserSlot
+from scheduler import completion_deadline, utcnow
+
+logger = logging.getLogger(__name__)
+
+# Write-combining для "горячих" слотов — опционально, по умолчанию выключен
+SHOW_WRITE_COMBINING = os.getenv("SHOW_WRITE_COMBINING", "0") == "1"
+SHOW_FLUSH_INTERVAL = float(os.getenv("SHOW_FLUSH_INTERVAL", "0.05"))  # секунды
+HOT_SLOT_THRESHOLD = int(os.getenv("HOT_SLOT_THRESHOLD", "20"))  # инкрементов в секунду на слот
+
+
+class ShowResult(NamedTuple):
+    status: Optional[str]  # статус слота после инкремента (None — слот не найден)
+    crossed: bool  # этот показ довёл слот до required_shows, и запустить завершение должен вызывающий
+
+
+def increment_shows_stmt(slot_id: int, n: int = 1):
+    """Атомарный UPDATE ... RETURNING.
+
+    Считаем только пока слот active; переход в completing (вместе с дедлайном
+    complete_at) происходит в том же операторе, поэтому порог пересекает ровно
+    один UPDATE. current_shows не превышает required_shows.
+    """
+    reached = PurchasedAdSlot.current_shows + n >= PurchasedAdSlot.required_shows
+    return (
+        update(PurchasedAdSlot)
+        .where(PurchasedAdSlot.id == slot_id, PurchasedAdSlot.status == "active")
+        .values(
+            current_shows=case(
+                (reached, PurchasedAdSlot.required_shows),
+                else_=PurchasedAdSlot.current_shows + n
+            ),
+            status=case((reached, "completing"), else_=PurchasedAdSlot.status),
+            complete_at=case((reached, completion_deadline()), else_=PurchasedAdSlot.complete_at)
+        )
+        .returning(PurchasedAdSlot.status)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def mark_subscribed_stmt(user_slot_ids: List[int]):
+    """active -> subscribed; RETURNING только реально переведённых строк — повтор запроса не засчитывается."""
+    return (
+        update(UserSlot)
+        .where(UserSlot.id.in_(user_slot_ids), UserSlot.status == "active")
+        .values(status="subscribed", subscribed_at=utcnow())
+        .returning(UserSlot.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+class ShowCounter:
+    """Подписка (UserSlot -> subscribed) и показ слота — одной транзакцией.
+
+    Обычный слот считается в транзакции запроса: оба UPDATE коммитит вызывающий.
+    Горячие слоты копятся в буфере, и flush() в одной транзакции переводит
+    UserSlot пачки и прибавляет показы по числу реально переведённых строк.
+    Пересечение порога в flush() само вызывает on_completing — не зависит от
+    того, дождался ли результата хоть один запрос.
+    """
+
+    def __init__(self, session_factory, write_combining: bool = SHOW_WRITE_COMBINING,
+                 flush_interval: float = SHOW_FLUSH_INTERVAL, hot_threshold: int = HOT_SLOT_THRESHOLD,
+                 on_completing: Optional[Callable[[int], None]] = None):
+        self._session_factory = session_factory
+        self.write_combining = write_combining
+        self.flush_interval = flush_interval
+        self.hot_threshold = hot_threshold
+        self._on_completing = on_completing
+        self._pending: Dict[int, List[Tuple[int, asyncio.Future]]] = defaultdict(list)
+        self._rate: Dict[int, int] = defaultdict(int)
+        self._rate_window = int(time.monotonic())
+        self._flusher: Optional[asyncio.Task] = None
+
+    def _is_hot(self, slot_id: int) -> bool:
+        window = int(time.monotonic())
+        if window != self._rate_window:
+            self._rate_window = window
+            self._rate.clear()
+        self._rate[slot_id] += 1
+        return self._rate[slot_id] > self.hot_threshold or slot_id in self._pending
+
+    async def record(self, db: AsyncSession, slot_id: int, user_slot_id: int) -> Optional[ShowResult]:
+        """Перевести UserSlot в subscribed и засчитать показ; None — строка уже не active (повтор)."""
+        if self.write_combining and self._is_hot(slot_id):
+            future = asyncio.get_running_loop().create_future()
+            self._pending[slot_id].append((user_slot_id, future))
+            if self._flusher is None or self._flusher.done():
+                self._flusher = asyncio.create_task(self._flush_later())
+            return await future
+
+        res = await db.execute(mark_subscribed_stmt([user_slot_id]))
+        if res.scalar() is None:
+            return None
+        res = await db.execute(increment_shows_stmt(slot_id))
+        status = res.scalar()
+        if status is not None:
+            return ShowResult(status, status == "completing")
+        # слот уже не active (или удалён) — показ не засчитывается
+        status = await db.scalar(select(PurchasedAdSlot.status).where(PurchasedAdSlot.id == slot_id))
+        return ShowResult(status, False)
+
+    async def _flush_later(self) -> None:
+        while self._pending:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        pending, self._pending = self._pending, defaultdict(list)
+        if not pending:
+            return
+        subscribed: Dict[int, set] = {}
+        statuses: Dict[int, Optional[str]] = {}
+        crossed: List[int] = []
+        try:
+            async with self._session_factory() as db:
+                for slot_id, waiters in pending.items():
+                    res = await db.execute(mark_subscribed_stmt([user_slot_id for user_slot_id, _ in waiters]))
+                    subscribed[slot_id] = set(res.scalars().all())
+                    status = None
+                    if subscribed[slot_id]:
+                        res = await db.execute(increment_shows_stmt(slot_id, len(subscribed[slot_id])))
+                        status = res.scalar()
+                    if status == "completing":
+                        crossed.append(slot_id)
+                    elif status is None:
+                        status = await db.scalar(select(PurchasedAdSlot.status).where(PurchasedAdSlot.id == slot_id))
+                    statuses[slot_id] = status
+                await db.commit()
+        except Exception as exc:
+            # откатились и подписки, и показы — повтор запроса посчитает их один раз
+            logger.exception("Show counter flush failed")
+            for waiters in pending.values():
+                for _, future in waiters:
+                    if not future.done():
+                        future.set_exception(exc)
+            return
+
+        for slot_id in crossed:
+            if self._on_completing is not None:
+                self._on_completing(slot_id)
+            else:
+                logger.error("Slot %s reached required_shows but no completion handler is set", slot_id)
+        for slot_id, waiters in pending.items():
+            for user_slot_id, future in waiters:
+                # повтор той же подписки в пачке засчитан один раз — результат получает первый запрос
+                counted = user_slot_id in subscribed[slot_id]
+                subscribed[slot_id].discard(user_slot_id)
+                if future.done():
+                    continue  # запрос отменён — подписка и показ всё равно записаны
+                # завершение уже запущено выше — вызывающему делать нечего
+                future.set_result(ShowResult(statuses[slot_id], False) if counted else None)
+
+    async def close(self) -> None:
+        if self._flusher and not self._flusher.done():
+            await self._flusher
+        await self.flush()
@@ -0,0 +1,50 @@
+# backend/events.py
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, Set
+
+from versions import state_versions
+
+logger = logging.getLogger(__name__)
+
+
+class EventBus:
+    """In-process pub/sub: user_id -> набор очередей открытых push-соединений."""
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if not queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+
+    def has_subscribers(self, user_id: int) -> bool:
+        return user_id in self._subscribers
+
+    def publish(self, user_id: int, event: dict) -> None:
+        # любое событие "slots"/"progress" — изменение состояния: ETag прошлых ответов больше не годится
+        state_versions.observe(user_id, event)
+        for queue in list(self._subscribers.get(user_id, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Медленный клиент: событие "slots" всё равно заставит его перечитать состояние
+                logger.warning("Event queue full for user %s, dropping %s", user_id, event.get("type"))
+
+    def publish_many(self, user_ids: Iterable[int], event: dict) -> None:
+        for user_id in set(user_ids):
+            self.publish(user_id, event)
+
+
+event_bus = EventBus()
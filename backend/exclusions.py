@@ -0,0 +1,115 @@
+# backend/exclusions.py
+import os
+import math
+import hashlib
+from typing import Dict, Iterable, Optional, Set
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from queries import subscribed_channels_stmt, subscribed_pairs_stmt
+from ttl_cache import TTLCache
+
+CHANNEL_EXCLUSIONS_SIZE = int(os.getenv("CHANNEL_EXCLUSIONS_SIZE", "20000"))  # пользователей
+# подписки на каналы пишутся не только этим процессом — периодически перестраиваем фильтр
+CHANNEL_EXCLUSIONS_TTL = float(os.getenv("CHANNEL_EXCLUSIONS_TTL", "300"))  # секунды
+CHANNEL_FILTER_FP_RATE = float(os.getenv("CHANNEL_FILTER_FP_RATE", "0.01"))
+CHANNEL_FILTER_MIN_CAPACITY = 16  # запас под подписки, добавленные после построения
+
+
+class ChannelBloomFilter:
+    """Bloom-фильтр по channel_username: без ложноотрицательных, ложноположительные ~fp_rate."""
+
+    __slots__ = ("capacity", "size", "hashes", "count", "_bits")
+
+    def __init__(self, capacity: int, fp_rate: float = CHANNEL_FILTER_FP_RATE):
+        self.capacity = max(capacity, CHANNEL_FILTER_MIN_CAPACITY)
+        self.size = max(64, int(-self.capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, channel_username: str):
+        digest = hashlib.blake2b(channel_username.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        # double hashing: k позиций из двух 64-битных хэшей
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, channel_username: Optional[str]) -> None:
+        if channel_username is None:
+            return
+        for pos in self._positions(channel_username):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, channel_username: Optional[str]) -> bool:
+        if channel_username is None:
+            return False  # NULL в SQL ни с чем не совпадает
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(channel_username))
+
+
+class ChannelExclusions:
+    """Per-user Bloom-фильтр каналов, на которые пользователь уже подписан.
+
+    Фильтр строится лениво при первом обращении и живёт в TTL/LRU кэше. Кандидаты,
+    которых фильтр отвергает, точно подходят; БД спрашивается только про
+    «возможно подписан» — чтобы отсеять ложноположительные.
+    """
+
+    def __init__(self, maxsize: int = CHANNEL_EXCLUSIONS_SIZE, ttl: float = CHANNEL_EXCLUSIONS_TTL):
+        self._filters: TTLCache[ChannelBloomFilter] = TTLCache(maxsize, ttl)
+        self.db_checks = 0
+        self.false_positives = 0
+
+    async def get(self, db: AsyncSession, user_id: int) -> ChannelBloomFilter:
+        bloom = self._filters.get(user_id)
+        if bloom is not None:
+            return bloom
+        res = await db.execute(subscribed_channels_stmt(user_id))
+        channels = res.scalars().all()
+        bloom = ChannelBloomFilter(len(channels) * 2)
+        for channel_username in channels:
+            bloom.add(channel_username)
+        self._filters.put(user_id, bloom)
+        return bloom
+
+    async def subscribed_among(self, db: AsyncSession, user_id: int,
+                               channel_usernames: Iterable[Optional[str]]) -> Set[str]:
+        """Те из channel_usernames, на которые пользователь подписан (точно, с подтверждением в БД)."""
+        bloom = await self.get(db, user_id)
+        maybe = {c for c in channel_usernames if c in bloom}
+        if not maybe:
+            return set()
+        self.db_checks += 1
+        res = await db.execute(subscribed_pairs_stmt([user_id], maybe))
+        confirmed = {channel_username for _, channel_username in res.all()}
+        self.false_positives += len(maybe) - len(confirmed)
+        return confirmed
+
+    def peek(self, user_id: int) -> Optional[ChannelBloomFilter]:
+        """Фильтр из кэша без обращения к БД (None — не построен или истёк)."""
+        return self._filters.peek(user_id)
+
+    def add(self, user_id: int, channel_username: Optional[str]) -> None:
+        """Только после commit строки user_subscribed_channels — иначе subscribed_among её не подтвердит."""
+        bloom = self._filters.peek(user_id)
+        if bloom is None:
+            return
+        if bloom.count >= bloom.capacity:
+            # фильтр заполнен — ложноположительных станет больше fp_rate, перестроим при следующем get
+            self.invalidate(user_id)
+            return
+        bloom.add(channel_username)
+
+    def invalidate(self, user_id: int) -> None:
+        self._filters.pop(user_id)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            **self._filters.stats(),
+            "db_checks": self.db_checks,
+            "false_positives": self.false_positives,
+        }
+
+
+channel_exclusions = ChannelExclusions()
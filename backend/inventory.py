@@ -0,0 +1,119 @@
+# backend/inventory.py
+import os
+import time
+import random
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from queries import active_inventory_stmt
+
+logger = logging.getLogger(__name__)
+
+# Индекс локален для процесса: при нескольких воркерах периодически перечитываем его из БД,
+# чтобы подхватить слоты, созданные/завершённые в других процессах
+INVENTORY_REFRESH_SECONDS = float(os.getenv("INVENTORY_REFRESH_SECONDS", "30"))
+
+VIP = "vip"
+STANDARD = "standard"
+
+
+class _Bucket:
+    """Множество slot_id с O(1) add/remove и случайной выборкой (list + позиция в dict)."""
+
+    def __init__(self):
+        self._items: List[int] = []
+        self._pos: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, slot_id: int) -> bool:
+        return slot_id in self._pos
+
+    def add(self, slot_id: int) -> None:
+        if slot_id in self._pos:
+            return
+        self._pos[slot_id] = len(self._items)
+        self._items.append(slot_id)
+
+    def remove(self, slot_id: int) -> None:
+        idx = self._pos.pop(slot_id, None)
+        if idx is None:
+            return
+        last = self._items.pop()
+        if last != slot_id:
+            self._items[idx] = last
+            self._pos[last] = idx
+
+    def sample(self, k: int, exclude: Set[int]) -> List[int]:
+        """До k случайных slot_id корзины, кроме exclude (в exclude бывают id других корзин)."""
+        available = len(self._items) - len(self._pos.keys() & exclude)
+        if available <= k:
+            return [sid for sid in self._items if sid not in exclude][:k]
+        picked: List[int] = []
+        seen: Set[int] = set()
+        # exclude обычно мал относительно корзины, поэтому rejection sampling быстрее полного прохода
+        while len(picked) < k:
+            sid = self._items[random.randrange(len(self._items))]
+            if sid in exclude or sid in seen:
+                continue
+            seen.add(sid)
+            picked.append(sid)
+        return picked
+
+
+class SlotInventory:
+    """Индекс активных PurchasedAdSlot, разбитый на VIP и standard корзины."""
+
+    def __init__(self):
+        self._buckets: Dict[str, _Bucket] = {VIP: _Bucket(), STANDARD: _Bucket()}
+        self._slot_bucket: Dict[int, str] = {}
+        self._loaded_at: Optional[float] = None
+
+    @staticmethod
+    def bucket_for(slot_type: Optional[str]) -> str:
+        return VIP if slot_type == VIP else STANDARD
+
+    def __len__(self) -> int:
+        return len(self._slot_bucket)
+
+    def __contains__(self, slot_id: int) -> bool:
+        return slot_id in self._slot_bucket
+
+    def add(self, slot_id: int, slot_type: Optional[str]) -> None:
+        bucket = self.bucket_for(slot_type)
+        previous = self._slot_bucket.get(slot_id)
+        if previous and previous != bucket:
+            self._buckets[previous].remove(slot_id)
+        self._buckets[bucket].add(slot_id)
+        self._slot_bucket[slot_id] = bucket
+
+    def remove(self, slot_id: int) -> None:
+        bucket = self._slot_bucket.pop(slot_id, None)
+        if bucket:
+            self._buckets[bucket].remove(slot_id)
+
+    def sample(self, bucket: str, k: int, exclude: Set[int]) -> List[int]:
+        return self._buckets[bucket].sample(k, exclude)
+
+    def bucket_size(self, bucket: str) -> int:
+        return len(self._buckets[bucket])
+
+    async def load(self, db: AsyncSession) -> None:
+        res = await db.execute(active_inventory_stmt())
+        rows: List[Tuple[int, str]] = res.all()
+        self._buckets = {VIP: _Bucket(), STANDARD: _Bucket()}
+        self._slot_bucket = {}
+        for slot_id, slot_type in rows:
+            self.add(slot_id, slot_type)
+        self._loaded_at = time.monotonic()
+        logger.info("Slot inventory loaded: %s vip, %s standard", self.bucket_size(VIP), self.bucket_size(STANDARD))
+
+    async def ensure_loaded(self, db: AsyncSession) -> None:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > INVENTORY_REFRESH_SECONDS:
+            await self.load(db)
+
+
+slot_inventory = SlotInventory()
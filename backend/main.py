@@ -1,31 +1,53 @@
 ﻿# backend/main.py
 import os
+import time
+_IMPORT_STARTED = time.perf_counter()
 import json
 import logging
-import urllib.parse
 from contextlib import asynccontextmanager
+from typing import Optional, Tuple
 import asyncio
-from random import shuffle
-from datetime import datetime
 
-from fastapi import FastAPI, Request, Depends, HTTPException, BackgroundTasks
+from fastapi import FastAPI, Request, Depends, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-
-from telegram import Update
-from telegram.ext import Application, CommandHandler, CallbackContext
-from telegram.constants import ParseMode
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse, ORJSONResponse, Response
 
 from dotenv import load_dotenv
 
 # === Наши модули ===
-from database import engine, AsyncSessionLocal
-from models import User, Base, PurchasedAdSlot, UserSlot, UserSubscribedChannel
-from auth import verify_telegram_initdata
+from database import engine, AsyncSessionLocal, pool_stats
+from models import User, Base, PurchasedAdSlot
+from auth import TelegramAuthenticator, TelegramInitData
+from events import event_bus
+from inventory import slot_inventory
+from counters import ShowCounter
+from scheduler import CompletionSweeper, CompletingCascade, UserSlotCompactor
+from timer import (
+    CYCLE_REWARD, evaluate_timer, settle_timer, set_timer_running, timer_switch_needed, timer_view,
+    buy_payout_upgrade
+)
+from write_buffer import UserWriteBuffer, UserFieldError, coerce_user_fields
+from registrations import UserRegistrations
+from cache import user_cache
+from versions import state_versions, SLOTS, PROGRESS
+from assets import asset_pipeline
+from exclusions import channel_exclusions
+from candidates import CandidateQueues, pick_slots_for_user
+from allocator import BatchAllocator
+from webhook_queue import QUEUED, REJECTED
+from telegram_bot import TelegramBot
+from startup import FAST_START, StartupTimer, check_schema_at_head, log_task_failure
+from slot_import import (
+    SLOT_BULK_BATCH, SLOT_BULK_MAX, SlotValidationError,
+    slot_row, iter_ndjson, iter_json_array, insert_slots,
+)
+import metrics
+from queries import (
+    user_slot_views_stmt, user_slot_stmt, user_open_slots_stmt,
+    advertiser_slots_stmt, insert_user_slots_stmt, slot_holders_stmt, subscribe_channel_stmt
+)
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, exists, delete
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -38,42 +60,93 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 WEBHOOK_URL = os.getenv("WEBHOOK_URL")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "")
 
-application = None
-if BOT_TOKEN:
-    application = Application.builder().token(BOT_TOKEN).build()
-
-async def start(update: Update, context: CallbackContext):
-    web_url = FRONTEND_URL or f"{WEBHOOK_URL.rsplit('/', 1)[0]}/"
-    keyboard = [[InlineKeyboardButton("Играть", web_app=WebAppInfo(url=web_url))]]
-    await update.message.reply_text(
-        "Привет! Это <b>MellStarGame</b>\nНажми «Играть»!",
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode=ParseMode.HTML
-    )
+WEB_APP_URL = FRONTEND_URL or (f"{WEBHOOK_URL.rsplit('/', 1)[0]}/" if WEBHOOK_URL else "")
+
+telegram_bot = TelegramBot(BOT_TOKEN, WEBHOOK_URL, WEB_APP_URL)
+startup_timer = StartupTimer()
+
+candidate_queues = CandidateQueues(AsyncSessionLocal)
+batch_allocator = BatchAllocator(AsyncSessionLocal)
+completion_sweeper = CompletionSweeper(AsyncSessionLocal, allocator=batch_allocator)
+completing_cascade = CompletingCascade(AsyncSessionLocal)
+
+
+def start_slot_completion(slot_id: int) -> None:
+    """Слот перешёл в completing (уже закоммичено) — убрать из подбора и запустить каскад держателей."""
+    slot_inventory.remove(slot_id)
+    candidate_queues.discard_slot(slot_id)
+    # UserSlot держателей переводит фоновый UPDATE; complete_at уже выставлен — слот завершит CompletionSweeper
+    completing_cascade.schedule(slot_id)
+
 
-if application:
-    application.add_handler(CommandHandler("start", start))
+show_counter = ShowCounter(AsyncSessionLocal, on_completing=start_slot_completion)
+user_slot_compactor = UserSlotCompactor(AsyncSessionLocal)
+user_write_buffer = UserWriteBuffer(AsyncSessionLocal)
+user_registrations = UserRegistrations(AsyncSessionLocal)
 
 # ======================
 # Lifespan
 # ======================
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-
-    if application and WEBHOOK_URL:
-        await application.initialize()
-        await application.bot.delete_webhook(drop_pending_updates=True)
-        await application.bot.set_webhook(url=WEBHOOK_URL)
+    started = time.perf_counter()
+    with startup_timer.phase("schema"):
+        if FAST_START:
+            # схему накатывает `alembic upgrade head` при деплое — здесь только проверка
+            await check_schema_at_head(engine)
+        else:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+
+    with startup_timer.phase("assets"):
+        asset_pipeline.build()
+
+    with startup_timer.phase("inventory"):
+        async with AsyncSessionLocal() as db:
+            await slot_inventory.load(db)
+
+    with startup_timer.phase("background"):
+        # Первый тик сразу подберёт слоты, истёкшие пока процесс был выключен
+        completion_sweeper.start()
+        batch_allocator.start()
+        completing_cascade.start()
+        user_slot_compactor.start()
+        candidate_queues.start()
+        user_write_buffer.start()
+        user_registrations.start()
+
+    webhook_task = None
+    with startup_timer.phase("telegram"):
+        if telegram_bot.enabled and WEBHOOK_URL:
+            if FAST_START:
+                # бот и webhook — в фоне, приложение начинает отвечать сразу
+                webhook_task = asyncio.create_task(telegram_bot.sync_webhook(), name="telegram-webhook")
+                webhook_task.add_done_callback(log_task_failure)
+            else:
+                await telegram_bot.reset_webhook()
+
+    startup_timer.record("lifespan", time.perf_counter() - started)
+    logger.info("Startup phases (fast_start=%s): %s", FAST_START, startup_timer.phases)
 
     yield
 
-    if application:
-        await application.shutdown()
+    if webhook_task and not webhook_task.done():
+        webhook_task.cancel()
+    await telegram_bot.shutdown()
+    await show_counter.close()
+    await completing_cascade.stop()
+    await completion_sweeper.stop()
+    await batch_allocator.stop()
+    await user_slot_compactor.stop()
+    await candidate_queues.stop()
+    await user_write_buffer.stop()
+    await user_registrations.stop()
 
 app = FastAPI(lifespan=lifespan)
 
+metrics.instrument_engine(engine)
+app.add_middleware(metrics.MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -91,51 +164,70 @@ async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
 
+# ======================
+# Telegram auth (initData проверяется один раз на запрос)
+# ======================
+telegram_auth = TelegramAuthenticator(BOT_TOKEN)
+
+def read_init_data(request: Request) -> str:
+    # EventSource не умеет слать заголовки, поэтому initData можно передать query-параметром
+    return request.headers.get("X-Telegram-WebApp-InitData", "") or request.query_params.get("init_data", "")
+
+async def optional_telegram_auth(request: Request) -> Optional[TelegramInitData]:
+    init_data = read_init_data(request)
+    request.state.telegram = telegram_auth.verify(init_data) if init_data else None
+    return request.state.telegram
+
+async def verify_init_data(request: Request) -> Optional[TelegramInitData]:
+    """Без initData запрос пропускается (как и раньше), с невалидной — 403."""
+    auth = await optional_telegram_auth(request)
+    if auth is None and read_init_data(request):
+        raise HTTPException(status_code=403, detail="Auth failed")
+    return auth
+
 # ======================
 # Telegram Webhook
 # ======================
 @app.post("/webhook")
 async def webhook(request: Request):
+    if not telegram_bot.enabled:
+        return {"status": "ok"}
     update_json = await request.json()
-    update = Update.de_json(update_json, application.bot)
-    if update:
-        await application.process_update(update)
-    return {"status": "ok"}
+    result = await telegram_bot.submit(update_json)
+    if result is None:
+        return {"status": "ok"}
+    if result == REJECTED:
+        # очередь полна — 503, Telegram повторит доставку позже
+        return JSONResponse({"status": result}, status_code=503, headers={"Retry-After": "1"})
+    return {"status": "ok" if result == QUEUED else result}
 
 # ======================
 # API: get user
 # ======================
-@app.get("/api/user/{user_id}")
-async def get_user(user_id: int, request: Request, db: AsyncSession = Depends(get_db)):
-    init_data = request.headers.get("X-Telegram-WebApp-InitData", "")
-    if init_data and not verify_telegram_initdata(init_data, BOT_TOKEN):
-        raise HTTPException(status_code=403, detail="Auth failed")
-
-    result = await db.get(User, user_id)
-    if not result:
-        result = User(
-            id=user_id,
-            level=1,
-            free_points=0,
-            distributed_points=0,
-            ref_points=0,
-            payout_bonus=0,
-            balance=0.0,
-            current_slot_count=5,
-            timer_speed_multiplier=1.0,
-            payout_rate=1.0
-        )
-        db.add(result)
-        await db.commit()
-        await db.refresh(result)
-
+async def get_or_create_user(db: AsyncSession, user_id: int) -> Tuple[User, bool]:
+    """Пользователь из кэша/БД (с несброшенными полями буфера) либо новый с дефолтами; второй элемент — создан ли."""
+    result, created = await user_cache.get_or_create(db, user_id)
+    if not created:
+        user_write_buffer.apply(result)
+    return result, created
+
+async def lock_user(db: AsyncSession, user_id: int) -> Optional[User]:
+    """Свежая строка под FOR UPDATE для записи: снимок кэша может отставать, и запись от него
+    затёрла бы balance/таймер, изменённые другим воркером. Несброшенные поля буфера накладываются."""
+    user = await user_cache.get_for_update(db, user_id)
+    if user is not None:
+        user_write_buffer.apply(user)
+    return user
+
+def user_view(result: User) -> dict:
+    timer = evaluate_timer(result)
     return {
         "level": result.level,
         "free_points": result.free_points,
         "distributed_points": result.distributed_points,
         "ref_points": result.ref_points,
         "payout_bonus": result.payout_bonus,
-        "balance": result.balance,
+        "balance": timer.balance,
         "current_slot_count": result.current_slot_count,
         "timer_speed_multiplier": result.timer_speed_multiplier,
         "payout_rate": result.payout_rate,
@@ -143,50 +235,101 @@ async def get_user(user_id: int, request: Request, db: AsyncSession = Depends(ge
         "current_checkpoint": result.current_checkpoint,
         "checkpoint_progress": result.checkpoint_progress,
         # include timer fields to allow frontend sync
-        "timer_progress": result.timer_progress,
-        "timer_running": result.timer_running,
+        "timer_progress": timer.progress,
+        "timer_running": timer.running,
     }
 
+@app.get("/api/user/{user_id}")
+async def get_user(user_id: int, db: AsyncSession = Depends(get_db), auth: Optional[TelegramInitData] = Depends(verify_init_data)):
+    result, _ = await get_or_create_user(db, user_id)
+    return user_view(result)
+
 # ======================
 # API: save user
 # ======================
 @app.post("/api/user/{user_id}")
 async def save_user(user_id: int, request: Request, db: AsyncSession = Depends(get_db)):
     payload = await request.json()
-    user = await db.get(User, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
 
-    allowed = {
-        "level", "free_points", "distributed_points", "payout_bonus", "balance",
-        "ref_points", "current_boost_level", "timer_started_at",
-        "current_checkpoint", "checkpoint_progress",
-        "current_slot_count", "timer_speed_multiplier", "payout_rate",
-        "timer_progress", "timer_running"
-    }
+    # balance / timer_* считает сервер (см. timer.py) — клиент их больше не пишет
+    try:
+        fields = coerce_user_fields(payload)
+    except UserFieldError as e:
+        raise HTTPException(status_code=422, detail={"field": e.field, "error": e.message})
+
+    # Меняются входы таймера — сначала зачислить накопленное по старой скорости/выплате.
+    # Это требует чтения строки, поэтому такие сохранения идут мимо буфера.
+    if any(key in fields for key in ("timer_speed_multiplier", "payout_rate")):
+        async with user_write_buffer.lock:
+            # Буфер забираем до lock_user: apply наложил бы поля как уже записанные,
+            # и setattr тех же значений не пометил бы строку dirty.
+            pending = user_write_buffer.take(user_id)
+            user = await lock_user(db, user_id)
+            if not user:
+                user_write_buffer.put(user_id, pending)
+                raise HTTPException(status_code=404, detail="User not found")
+            fields = {**pending, **fields}
+            settle_timer(user)
+            for key, value in fields.items():
+                setattr(user, key, value)
+            await db.commit()
+            user_cache.put(user)
+        state_versions.bump_all(user_id)
+        return {"status": "saved"}
 
-    for key, value in payload.items():
-        if key in allowed and hasattr(user, key):
-            setattr(user, key, value)
+    if user_id not in user_write_buffer and await user_cache.get(db, user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
 
-    await db.commit()
+    # Write-behind: поля сольются с предыдущими сохранениями и уйдут пачкой
+    user_write_buffer.put(user_id, fields)
+    user_cache.update(user_id, fields)
+    state_versions.bump_all(user_id)  # current_slot_count влияет на дозаполнение слотов
     return {"status": "saved"}
 
-@app.get("/api/purchased_slots/{user_id}")
-async def get_purchased_slots(user_id: int, request: Request, db: AsyncSession = Depends(get_db)):
-    init_data = request.headers.get("X-Telegram-WebApp-InitData", "")
-    if init_data and not verify_telegram_initdata(init_data, BOT_TOKEN):
+@app.post("/api/user/{user_id}/buy_payout")
+async def buy_payout(user_id: int, db: AsyncSession = Depends(get_db), auth: Optional[TelegramInitData] = Depends(verify_init_data)):
+    """Покупка "+1 ⭐ за цикл": зачислить таймер, проверить и списать баланс — под блокировкой строки."""
+    if auth is not None and auth.user_id != user_id:
         raise HTTPException(status_code=403, detail="Auth failed")
+    async with user_write_buffer.lock:
+        # Забираем буфер до lock_user: иначе apply наложит поля как уже записанные,
+        # и setattr тех же значений не пометит строку dirty.
+        pending = user_write_buffer.take(user_id)
+        user = await lock_user(db, user_id)
+        if not user:
+            user_write_buffer.put(user_id, pending)
+            raise HTTPException(status_code=404, detail="User not found")
+        for key, value in pending.items():
+            setattr(user, key, value)
+        if not buy_payout_upgrade(user):
+            await db.rollback()
+            user_write_buffer.put(user_id, pending)
+            raise HTTPException(status_code=400, detail="Insufficient balance")
+        await db.commit()
+        user_cache.put(user)
+    state_versions.bump_all(user_id)
+    progress = timer_view(user)
+    event_bus.publish(user_id, {"type": "progress", **progress})
+    return {
+        "status": "purchased",
+        "payout_rate": user.payout_rate,
+        "payout_bonus": user.payout_bonus,
+        "payout_per_cycle": CYCLE_REWARD * user.payout_rate,
+        **progress,
+    }
 
+@app.get("/api/purchased_slots/{user_id}")
+async def get_purchased_slots(user_id: int, db: AsyncSession = Depends(get_db), auth: Optional[TelegramInitData] = Depends(verify_init_data)):
     # Проверяем, что пользователь существует (опционально)
-    user = await db.get(User, user_id)
+    user = await user_cache.get(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
+    return await fetch_purchased_slot_views(db, user_id)
+
+async def fetch_purchased_slot_views(db: AsyncSession, user_id: int) -> list:
     # Запрос всех купленных слотов для этого пользователя
-    result = await db.execute(
-        select(PurchasedAdSlot).where(PurchasedAdSlot.advertiser_id == user_id)
-    )
+    result = await db.execute(advertiser_slots_stmt(user_id))
     slots = result.scalars().all()
 
     # Формируем ответ (аналогично /api/user_slots)
@@ -208,99 +351,151 @@ async def get_purchased_slots(user_id: int, request: Request, db: AsyncSession =
 # ======================
 # API: get personal slots for user (assign if less than current_slot_count)
 # ======================
-@app.get("/api/user_slots/{user_id}")
-async def get_user_slots(user_id: int, request: Request, db: AsyncSession = Depends(get_db)):
-    init_data = request.headers.get("X-Telegram-WebApp-InitData", "")
-    if init_data and not verify_telegram_initdata(init_data, BOT_TOKEN):
-        raise HTTPException(status_code=403, detail="Auth failed")
+def user_slot_view(slot_id, channel_name, link, slot_type, status) -> dict:
+    return {
+        "slot_id": slot_id,
+        "title": channel_name,
+        "link": link,
+        "type": slot_type,
+        "status": status
+    }
 
-    user = await db.get(User, user_id)
+async def fetch_user_slot_views(db: AsyncSession, user_id: int) -> list:
+    """UserSlot + PurchasedAdSlot одним JOIN-запросом, уже в форме ответа /api/user_slots."""
+    res = await db.execute(user_slot_views_stmt(user_id))
+    return [user_slot_view(*row) for row in res.all()]
+
+def not_modified(request: Request, kind: str, user_id: int, since: Optional[int] = None) -> Optional[Response]:
+    """304 по If-None-Match, если состояние не менялось с прошлого полного ответа — без обращения к БД."""
+    etag = state_versions.cached_etag(kind, user_id, since)
+    if etag and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+@app.get("/api/user_slots/{user_id}")
+async def get_user_slots(user_id: int, request: Request, since: Optional[int] = None,
+                         db: AsyncSession = Depends(get_db), auth: Optional[TelegramInitData] = Depends(verify_init_data)):
+    cached = not_modified(request, SLOTS, user_id, since)
+    if cached:
+        return cached
+
+    version = state_versions.current(SLOTS, user_id)
+    user = await user_cache.get(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    user_write_buffer.apply(user)  # current_slot_count мог прийти в ещё не сброшенном save_user
+    result, user = await sync_user_slots(db, user)
 
-    current_us_res = await db.execute(
-        select(UserSlot).where(
-            UserSlot.user_id == user_id,
-            UserSlot.status.in_(["active", "subscribed", "completing"])  # Показывать completing с отсчётом
-        )
+    changes = state_versions.delta(SLOTS, user_id, since, result) if since is not None else None
+    # недобор ячеек (пустой инвентарь) не кэшируем — следующий poll должен снова попробовать назначить
+    stored = state_versions.remember(
+        SLOTS, user_id, version, cacheable=len(result) >= user.current_slot_count, views=result
     )
-    current_user_slots = current_us_res.scalars().all()
-    count_current = len(current_user_slots)
+    headers = {"ETag": state_versions.etag(SLOTS, stored, since)} if stored else {}
+    if since is None:
+        return JSONResponse(result, headers=headers)
+    # ?since=<version>: только изменившиеся слоты относительно ответа этой версии
+    if changes is None:
+        return JSONResponse({"version": stored, "full": True, "slots": result}, headers=headers)
+    return JSONResponse({"version": stored, "full": False, **changes}, headers=headers)
+
+async def sync_user_slots(db: AsyncSession, user: User) -> Tuple[list, User]:
+    """Слоты пользователя с дозаполнением до current_slot_count и пользователь после пересчёта таймера."""
+    user_id = user.id
+    result = await fetch_user_slot_views(db, user_id)
+    need = user.current_slot_count - len(result)
 
     # assign more if needed
-    if count_current < user.current_slot_count:
-        subq_slot = exists().where(
-            UserSlot.slot_id == PurchasedAdSlot.id,
-            UserSlot.user_id == user_id
-        )
-        subq_channel = exists().where(
-            UserSubscribedChannel.user_id == user_id,
-            UserSubscribedChannel.channel_username == PurchasedAdSlot.channel_username
-        )
-        available_res = await db.execute(
-            select(PurchasedAdSlot).where(
-                PurchasedAdSlot.status == "active",  # Только active, без completing/completed
-                ~subq_slot,
-                ~subq_channel
+    if need > 0:
+        # недобор пересчитывается под FOR UPDATE строки users: BatchAllocator берёт ту же блокировку,
+        # так что одного пользователя не дозаполняют два пути сразу
+        locked = await lock_user(db, user_id)
+        if locked is not None:
+            user = locked
+            result = await fetch_user_slot_views(db, user_id)
+            need = user.current_slot_count - len(result)
+        assigned = {view["slot_id"] for view in result}
+        # обычно хватает предвыбранной очереди; подбор в запросе — только если она пуста (первый заход)
+        to_assign = candidate_queues.take(user_id, need, exclude=assigned) if need > 0 else []
+        if len(to_assign) < need:
+            to_assign += await pick_slots_for_user(
+                db, user_id, need - len(to_assign), exclude=assigned | {s.id for s in to_assign}
             )
-        )
-        available_slots = available_res.scalars().all()
-        # Сортировка: сначала старые слоты (FIFO), затем VIP приоритет
-        available_slots.sort(key=lambda s: (s.created_at, 0 if s.slot_type == "vip" else 1))  # VIP (0) перед std (1), по created_at
-        vip = [s for s in available_slots if s.slot_type == "vip"]
-        std = [s for s in available_slots if s.slot_type != "vip"]
-        shuffle(vip)  # Рандом внутри VIP
-        shuffle(std)  # Рандом внутри std
-        to_assign = vip + std  # VIP всегда первыми (вверх в списке)
-        to_assign = to_assign[: (user.current_slot_count - count_current)]
-
-        for s in to_assign:
-            db.add(UserSlot(user_id=user_id, slot_id=s.id, status="active"))
-        await db.commit()
 
-        current_us_res = await db.execute(
-            select(UserSlot).where(
-                UserSlot.user_id == user_id,
-                UserSlot.status.in_(["active", "subscribed", "completing"])  # Показывать completing с отсчётом
+        if to_assign:
+            # один INSERT на все строки; пары, уже вставленные другим путём, пропускаются
+            res = await db.execute(insert_user_slots_stmt(
+                db.get_bind().dialect.name,
+                [{"user_id": user_id, "slot_id": s.id, "status": "active"} for s in to_assign]
+            ))
+            inserted = {slot_id for _, slot_id in res.all()}
+            to_assign = [s for s in to_assign if s.id in inserted]
+        # commit и без вставки — снять блокировку строки users
+        await db.commit()
+        if locked is not None:
+            user_cache.put(locked)
+
+        if to_assign:
+            metrics.slot_assignments.inc(len(to_assign))
+            event_bus.publish(user_id, {"type": "slots", "reason": "assigned"})
+            # Новые строки уже известны — повторный SELECT не нужен
+            result.extend(
+                user_slot_view(s.id, s.channel_name, s.link, s.slot_type, "active")
+                for s in to_assign
             )
-        )
-        current_user_slots = current_us_res.scalars().all()
+            result.sort(key=lambda view: view["slot_id"])
+    else:
+        # ячейки заполнены — очередь всё равно держим тёплой к следующей подписке
+        candidate_queues.request_refill(user_id)
 
     # timer_running computed (true only when no 'active' slots)
-    has_pending = any(us.status == "active" for us in current_user_slots)
-    if user.timer_running != (not has_pending):
-        user.timer_running = not has_pending
-        await db.commit()
-
-    # build response
-    result = []
-    for us in sorted(current_user_slots, key=lambda us: us.slot_id):
-        slot = await db.get(PurchasedAdSlot, us.slot_id)
-        if slot:
-            result.append({
-                "slot_id": slot.id,
-                "title": slot.channel_name,
-                "link": slot.link,
-                "type": slot.slot_type,
-                "status": us.status
-            })
-
+    running = not any(view["status"] == "active" for view in result)
+    # решение по снимку (горячий poll не блокирует строку), сама запись — от свежей строки
+    if timer_switch_needed(user, running):
+        locked = await lock_user(db, user_id)
+        if locked is not None:
+            if set_timer_running(locked, running):
+                await db.commit()
+                event_bus.publish(user_id, {"type": "progress", **timer_view(locked)})
+            else:
+                await db.rollback()
+            user_cache.put(locked)
+            user = locked
+
+    return result, user
 
-    return result
+# ======================
+# API: bootstrap (запуск mini-app одним запросом)
+# ======================
+@app.get("/api/bootstrap/{user_id}", response_class=ORJSONResponse)
+async def bootstrap(user_id: int, db: AsyncSession = Depends(get_db), auth: Optional[TelegramInitData] = Depends(verify_init_data)):
+    """Пользователь, его слоты и купленные слоты — одна проверка initData, одна сессия, 2–3 запроса к БД."""
+    user, created = await get_or_create_user(db, user_id)
+    user_slots, user = await sync_user_slots(db, user)
+    purchased_slots = await fetch_purchased_slot_views(db, user_id)
+    # user_view после sync_user_slots: timer_running мог измениться при дозаполнении
+    return ORJSONResponse({
+        "user": {**user_view(user), "new_user": created},
+        "user_slots": user_slots,
+        "purchased_slots": purchased_slots,
+    })
 
 @app.delete("/api/slot/{slot_id}")
-async def delete_slot(slot_id: int, request: Request, db: AsyncSession = Depends(get_db)):
-    init_data = request.headers.get("X-Telegram-WebApp-InitData", "")
-    if init_data and not verify_telegram_initdata(init_data, BOT_TOKEN):
+async def delete_slot(slot_id: int, db: AsyncSession = Depends(get_db), auth: Optional[TelegramInitData] = Depends(verify_init_data)):
+    user_id = auth.user_id if auth else None
+    if user_id is None:
         raise HTTPException(status_code=403, detail="Auth failed")
-
-    user_id = ...  # Извлеки user_id из init_data, как в других endpoints (парсинг user_str)
     slot = await db.get(PurchasedAdSlot, slot_id)
     if not slot or slot.advertiser_id != user_id:
         raise HTTPException(status_code=404, detail="Slot not found or not yours")
     
+    holders = (await db.execute(slot_holders_stmt(slot_id))).scalars().all()
     await db.delete(slot)
     await db.commit()
+    slot_inventory.remove(slot_id)
+    candidate_queues.discard_slot(slot_id)
+    # слот пропал из ответа /api/user_slots держателей — их ETag и снимки для дельт больше не годятся
+    event_bus.publish_many(holders, {"type": "slots", "reason": "deleted", "slot_id": slot_id})
     return {"status": "deleted"}
 
 
@@ -308,20 +503,16 @@ async def delete_slot(slot_id: int, request: Request, db: AsyncSession = Depends
 # Subscribe slot
 # ======================
 @app.post("/api/subscribe_slot")
-async def subscribe_slot(request: Request, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)):
+async def subscribe_slot(request: Request, db: AsyncSession = Depends(get_db), auth: Optional[TelegramInitData] = Depends(verify_init_data)):
     payload = await request.json()
     user_id = payload.get("user_id")
     slot_id = payload.get("slot_id")
 
-    init_data = request.headers.get("X-Telegram-WebApp-InitData", "")
-    if init_data and not verify_telegram_initdata(init_data, BOT_TOKEN):
-        raise HTTPException(status_code=403, detail="Auth failed")
-
-    user = await db.get(User, user_id)
+    user = await user_cache.get(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    us_res = await db.execute(select(UserSlot).where(UserSlot.user_id == user_id, UserSlot.slot_id == slot_id))
+    us_res = await db.execute(user_slot_stmt(user_id, slot_id))
     user_slot = us_res.scalar()
     if not user_slot:
         raise HTTPException(status_code=404, detail="UserSlot not found")
@@ -329,57 +520,85 @@ async def subscribe_slot(request: Request, background_tasks: BackgroundTasks, db
     if user_slot.status != "active":
         return {"status": "already processed", "timer_running": user.timer_running}
 
-    user_slot.status = "subscribed"
-    user_slot.subscribed_at = datetime.utcnow()
+    # UserSlot -> subscribed и показ коммитятся вместе; порог required_shows определяется в том же UPDATE
+    shows = await show_counter.record(db, slot_id, user_slot.id)
+    if shows is None:
+        # параллельный повтор уже перевёл строку — показ не считаем второй раз
+        await db.rollback()
+        return {"status": "already processed", "timer_running": user.timer_running}
+    # Bloom-фильтр пополняется только каналами, которые есть в БД
+    channel_res = await db.execute(subscribe_channel_stmt(db.get_bind().dialect.name, user_id, slot_id))
+    channel_username = channel_res.scalar()
+    await db.commit()
+    metrics.slot_subscriptions.inc()
 
-    slot = await db.get(PurchasedAdSlot, slot_id)
-    if slot:
-        slot.current_shows += 1  # Инкремент подписок
-        await db.commit()
+    if channel_username is not None:
+        candidate_queues.on_subscribed(user_id, channel_username)
+    if shows.crossed:
+        # слот перешёл в completing — начать отсчёт
+        start_slot_completion(slot_id)
 
-        if slot.current_shows >= slot.required_shows:
-            slot.status = "completing"  # Начать отсчёт
-            # Обновить все UserSlot на completing
-            us_res = await db.execute(select(UserSlot).where(UserSlot.slot_id == slot_id))
-            user_slots = us_res.scalars().all()
-            for us in user_slots:
-                us.status = "completing"
-            await db.commit()
-            # Запустить background для задержки +1 мин
-            background_tasks.add_task(complete_slot_final, slot_id)
-
-    # recompute timer_running
-    cur_res = await db.execute(
-        select(UserSlot).where(
-            UserSlot.user_id == user_id,
-            UserSlot.status.in_(["active", "subscribed"])
-        )
-    )
+    # recompute timer_running; UserSlot переведён UPDATE-ом мимо ORM — перечитываем строки
+    cur_res = await db.execute(user_open_slots_stmt(user_id).execution_options(populate_existing=True))
     cur_slots = cur_res.scalars().all()
-    user.timer_running = not any(us.status == "active" for us in cur_slots)
+    user = await lock_user(db, user_id)
+    set_timer_running(user, not any(us.status == "active" for us in cur_slots))
     await db.commit()
+    user_cache.put(user)
 
-    return {"status": "subscribed", "slot_status": slot.status if slot else "unknown", "timer_running": user.timer_running}
+    event_bus.publish(user_id, {"type": "slots", "reason": "subscribed", "slot_id": slot_id})
+    event_bus.publish(user_id, {"type": "progress", **timer_view(user)})
 
-async def complete_slot_final(slot_id: int):
-    await asyncio.sleep(60)  # 1 мин для теста, в проде 600 для 10 мин
-    async with AsyncSessionLocal() as db:
-        slot = await db.get(PurchasedAdSlot, slot_id)
-        if slot and slot.status == "completing":
-            slot.status = "completed"
-            # Удалить все UserSlot с этим slot_id
-            await db.execute(delete(UserSlot).where(UserSlot.slot_id == slot_id))
-            await db.commit()
+    return {"status": "subscribed", "slot_status": shows.status or "unknown", "timer_running": user.timer_running}
 
 # ======================
 # get user progress (for polling)
 # ======================
 @app.get("/api/user_progress/{user_id}")
-async def get_user_progress(user_id: int, db: AsyncSession = Depends(get_db)):
-    user = await db.get(User, user_id)
+async def get_user_progress(user_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    cached = not_modified(request, PROGRESS, user_id)
+    if cached:
+        return cached
+
+    version = state_versions.current(PROGRESS, user_id)
+    user = await user_cache.get(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return {"timer_progress": user.timer_progress, "timer_running": user.timer_running}
+    # Прогресс и зачисленные циклы считаются на чтении от timer_started_at — без записи в БД
+    view = timer_view(user)
+    # пока таймер идёт, прогресс меняется с каждой секундой — такой ответ не кэшируется
+    stored = state_versions.remember(PROGRESS, user_id, version, cacheable=not view["timer_running"])
+    headers = {"ETag": state_versions.etag(PROGRESS, stored)} if stored else {}
+    return JSONResponse(view, headers=headers)
+
+# ======================
+# Push channel (SSE) — заменяет 3-секундный polling
+# ======================
+EVENTS_KEEPALIVE_SECONDS = 15
+
+@app.get("/api/events/{user_id}")
+async def user_events(user_id: int, request: Request, auth: Optional[TelegramInitData] = Depends(verify_init_data)):
+    queue = event_bus.subscribe(user_id)
+
+    async def stream():
+        try:
+            # клиент сразу перечитывает состояние, пропущенное за время переподключения
+            yield "retry: 3000\nevent: ready\ndata: {}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            event_bus.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # ======================
 # Create slot (no auth)
@@ -402,56 +621,99 @@ async def create_slot(request: Request, db: AsyncSession = Depends(get_db)):
     db.add(new_slot)
     await db.commit()
     await db.refresh(new_slot)
+    slot_inventory.add(new_slot.id, new_slot.slot_type)
 
     return {"status": "created", "slot_id": new_slot.id}
 
+@app.post("/api/slots/bulk")
+async def create_slots_bulk(request: Request, db: AsyncSession = Depends(get_db)):
+    """JSON-массив или NDJSON (Content-Type: application/x-ndjson) слотов — всё в одной транзакции."""
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        items = iter_ndjson(request.stream())
+    else:
+        try:
+            payload = await request.json()
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Invalid JSON")
+        if not isinstance(payload, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of slots")
+        items = iter_json_array(payload)
+
+    created = []
+    batch = []
+    try:
+        async for index, item in items:
+            if index >= SLOT_BULK_MAX:
+                raise HTTPException(status_code=413, detail=f"At most {SLOT_BULK_MAX} slots per request")
+            batch.append(slot_row(item, index))
+            if len(batch) >= SLOT_BULK_BATCH:
+                created.extend(await insert_slots(db, batch))
+                batch = []
+        created.extend(await insert_slots(db, batch))
+    except SlotValidationError as e:
+        await db.rollback()
+        raise HTTPException(status_code=422, detail={"index": e.index, "error": e.message})
+    await db.commit()
+
+    # сразу в индекс — слоты доступны для подбора без перечитывания из БД
+    for slot_id, slot_type in created:
+        slot_inventory.add(slot_id, slot_type)
+
+    return {"status": "created", "count": len(created), "slot_ids": [slot_id for slot_id, _ in created]}
+
 # ======================
 # Root
 # ======================
 @app.get("/")
-async def root(request: Request, db: AsyncSession = Depends(get_db)):
-    init_data = request.headers.get("X-Telegram-WebApp-InitData", "")
-
-    user_id = None
-    if init_data and verify_telegram_initdata(init_data, BOT_TOKEN):
-        try:
-            for part in init_data.split("&"):
-                if part.startswith("user="):
-                    user_str = urllib.parse.unquote(part[5:])
-                    user_info = json.loads(user_str)
-                    user_id = user_info.get("id")
-                    if user_id:
-                        db_user = await db.get(User, user_id)
-                        if not db_user:
-                            new_user = User(
-                                id=user_id,
-                                username=user_info.get("username"),
-                                first_name=user_info.get("first_name"),
-                                level=1,
-                                free_points=0,
-                                distributed_points=0,
-                                ref_points=0,
-                                payout_bonus=0,
-                                balance=0.0,
-                                current_slot_count=5,
-                                timer_speed_multiplier=1.0,
-                                payout_rate=1.0
-                            )
-                            db.add(new_user)
-                            await db.commit()
-                    break
-        except Exception:
-            pass
-
-    return FileResponse("static/index.html")
+async def root(request: Request, auth: Optional[TelegramInitData] = Depends(optional_telegram_auth)):
+    user_info = auth.user if auth else {}
+    user_id = user_info.get("id")
+    # без БД на пути запроса: регистрация уходит в фоновую пачку, пользователь из кэша уже есть в БД
+    if user_id and user_id not in user_cache:
+        user_registrations.schedule(user_id, user_info.get("username"), user_info.get("first_name"))
+
+    # index.html из памяти: ссылки на fingerprinted-ассеты, ETag, gzip/brotli
+    return asset_pipeline.index_response(request)
+
+@app.get("/assets/{name}")
+async def fingerprinted_asset(name: str, request: Request):
+    response = asset_pipeline.asset_response(request, name)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return response
 
 # ======================
 # Health
 # ======================
 @app.get("/health")
 async def health():
-    return {"status": "ok", "message": "MellStarGame ready"}
+    return {"status": "ok", "message": "MellStarGame ready", "user_cache": user_cache.stats(),
+            "channel_exclusions": channel_exclusions.stats(), "candidate_queues": candidate_queues.stats(),
+            "startup": startup_timer.phases, "state_versions": state_versions.stats(),
+            "pending_registrations": len(user_registrations)}
+
+@app.get("/health/pool")
+async def health_pool():
+    # checked_out / overflow / гистограмма ожидания соединения — видно, когда запросы стоят в очереди к пулу
+    return pool_stats()
+
+@app.get("/health/webhook")
+async def health_webhook():
+    queue = telegram_bot.queue
+    if not queue:
+        return {"enabled": False}
+    return {"enabled": True, "depth": len(queue), "maxsize": queue.maxsize, "workers": queue.workers}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    stats = pool_stats()
+    metrics.db_pool_checked_out.set(stats.get("checked_out", 0))
+    metrics.db_pool_overflow.set(stats.get("overflow", 0))
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
+startup_timer.record("import_main", time.perf_counter() - _IMPORT_STARTED)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=int(os.getenv("PORT", 10000)))
\ No newline at end of file
+    uvicorn.run("main:app", host="0.0.0.0", port=int(os.getenv("PORT", 10000)))
@@ -0,0 +1,195 @@
+# backend/metrics.py
+# Метрики в Prometheus text format: латентность по роутам, SQL на запрос, бизнес-счётчики.
+# Всё in-process и без блокировок — накладные расходы на запрос: пара dict-операций и bisect.
+import time
+import bisect
+import contextvars
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+# Роуты, которые не меряем: долгоживущий SSE и сам /metrics
+UNTRACKED_ROUTES = {"/api/events/{user_id}", "/metrics"}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[Labels, float] = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        self._values[tuple(sorted(labels.items()))] += amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        if not self._values:
+            lines.append(f"{self.name} 0")
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(labels)} {value:g}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value: float, **labels) -> None:
+        self._values[tuple(sorted(labels.items()))] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self._counts: Dict[Labels, List[int]] = {}
+        self._sums: Dict[Labels, float] = defaultdict(float)
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, counts in self._counts.items():
+            running = 0
+            for bound, count in zip(self.buckets, counts):
+                running += count
+                lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', f'{bound:g}'))} {running}")
+            running += counts[-1]
+            lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', '+Inf'))} {running}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {self._sums[labels]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {running}")
+        return lines
+
+
+request_latency = Histogram(
+    "http_request_duration_seconds", "Request latency by route.", LATENCY_BUCKETS
+)
+request_queries = Histogram(
+    "http_request_db_queries", "SQL statements executed per request.", QUERY_COUNT_BUCKETS
+)
+request_db_time = Histogram(
+    "http_request_db_seconds", "Time spent in SQL per request.", LATENCY_BUCKETS
+)
+slot_assignments = Counter("slot_assignments_total", "User slots assigned.")
+slot_subscriptions = Counter("slot_subscriptions_total", "Successful slot subscriptions.")
+slot_completions = Counter("slot_completions_total", "Purchased slots moved to completed.")
+user_slots_archived = Counter("user_slots_archived_total", "Completed user slots moved to user_slot_history.")
+db_pool_checked_out = Gauge("db_pool_checked_out", "Connections currently checked out of the pool.")
+db_pool_overflow = Gauge("db_pool_overflow", "Connections open above pool_size.")
+
+REGISTRY: list = [
+    request_latency, request_queries, request_db_time,
+    slot_assignments, slot_subscriptions, slot_completions, user_slots_archived,
+    db_pool_checked_out, db_pool_overflow,
+]
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ======================
+# SQL per request (engine events)
+# ======================
+class _RequestDbStats:
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+_request_db: contextvars.ContextVar[Optional[_RequestDbStats]] = contextvars.ContextVar("request_db", default=None)
+
+
+def instrument_engine(engine) -> None:
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["metrics_query_start"].pop()
+        stats = _request_db.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.seconds += time.perf_counter() - started
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        # after_cursor_execute при ошибке не вызывается — не даём стеку расти
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("metrics_query_start"):
+            conn.info["metrics_query_start"].pop()
+
+
+# ======================
+# ASGI middleware
+# ======================
+class MetricsMiddleware:
+    """Чистый ASGI middleware (без BaseHTTPMiddleware) — дешевле на каждом запросе."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = _RequestDbStats()
+        token = _request_db.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _request_db.reset(token)
+            # scope["route"] проставляет роутер FastAPI — метка по шаблону, а не по конкретному id
+            route = getattr(scope.get("route"), "path", None)
+            if route is None:
+                route = "/static" if scope["path"].startswith("/static") else "unmatched"
+            if route not in UNTRACKED_ROUTES:
+                labels = {"route": route, "method": scope["method"], "status": str(status_code)}
+                request_latency.observe(time.perf_counter() - started, **labels)
+                request_queries.observe(stats.queries, route=route, method=scope["method"])
+                request_db_time.observe(stats.seconds, route=route, method=scope["method"])
@@ -9,6 +9,8 @@ from sqlalchemy import (
     Boolean,
     Text,
     func,
+    text,
+    Index,
     UniqueConstraint
 )
 from database import Base
@@ -61,18 +63,58 @@ class PurchasedAdSlot(Base):
     current_shows = Column(Integer, default=0)
     price_paid = Column(Float)
     status = Column(String, default="active")  # active / completing / completed
+    complete_at = Column(DateTime(timezone=True), nullable=True)  # дедлайн перехода completing -> completed
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        # inventory load / подбор слотов: только active, VIP/standard, FIFO
+        Index(
+            "ix_purchased_slots_active_type_created", "slot_type", "created_at",
+            postgresql_where=text("status = 'active'"), sqlite_where=text("status = 'active'")
+        ),
+        # CompletionSweeper: дедлайны только у completing
+        Index(
+            "ix_purchased_slots_completing_due", "complete_at",
+            postgresql_where=text("status = 'completing'"), sqlite_where=text("status = 'completing'")
+        ),
+        # /api/purchased_slots
+        Index("ix_purchased_slots_advertiser_created", "advertiser_id", "created_at"),
+    )
+
 
 class UserSlot(Base):
     __tablename__ = "user_slots"
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(BigInteger, index=True)
+    user_id = Column(BigInteger)  # индексы — составные, см. __table_args__
     slot_id = Column(Integer, index=True)
     status = Column(String, default="active")  # active / subscribed / completing / completed / need_subscribe
     subscribed_at = Column(DateTime(timezone=True), nullable=True)
 
+    __table_args__ = (
+        # /api/user_slots: user_id + status IN (...), slot_id для JOIN без обращения к таблице
+        Index("ix_user_slots_user_status_slot", "user_id", "status", "slot_id"),
+        # subscribe_slot и NOT EXISTS при подборе: (user_id, slot_id);
+        # уникальность — один слот не назначается пользователю дважды (ON CONFLICT DO NOTHING)
+        Index("uq_user_slots_user_slot", "user_id", "slot_id", unique=True),
+        # UserSlotCompactor: completed-строки, ожидающие переноса в историю
+        Index(
+            "ix_user_slots_completed", "id",
+            postgresql_where=text("status = 'completed'"), sqlite_where=text("status = 'completed'")
+        ),
+    )
+
+
+class UserSlotHistory(Base):
+    """Холодная часть user_slots: завершённые назначения, перенесённые компактором."""
+    __tablename__ = "user_slot_history"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=False)  # id исходной строки user_slots
+    user_id = Column(BigInteger, index=True)
+    slot_id = Column(Integer)
+    subscribed_at = Column(DateTime(timezone=True), nullable=True)  # NULL — слот завершился без подписки
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
 
 class Transaction(Base):
     __tablename__ = "transactions"
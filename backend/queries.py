@@ -0,0 +1,233 @@
+# backend/queries.py
+# Горячие запросы API в одном месте: их же проверяет на планы bench/query_plans.py
+from datetime import datetime
+from typing import Iterable, List
+
+from sqlalchemy import BigInteger, select, update, exists, or_, and_, func, literal
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import User, PurchasedAdSlot, UserSlot, UserSubscribedChannel
+
+VISIBLE_USER_SLOT_STATUSES = ("active", "subscribed", "completing")  # Показывать completing с отсчётом
+
+
+def user_slot_views_stmt(user_id: int):
+    """UserSlot + PurchasedAdSlot одним JOIN — строки ответа /api/user_slots."""
+    return (
+        select(
+            UserSlot.slot_id,
+            PurchasedAdSlot.channel_name,
+            PurchasedAdSlot.link,
+            PurchasedAdSlot.slot_type,
+            UserSlot.status
+        )
+        .join(PurchasedAdSlot, PurchasedAdSlot.id == UserSlot.slot_id)
+        .where(
+            UserSlot.user_id == user_id,
+            UserSlot.status.in_(VISIBLE_USER_SLOT_STATUSES)
+        )
+        .order_by(UserSlot.slot_id)
+    )
+
+
+def eligible_slots_stmt(user_id: int, candidate_ids: Iterable[int]):
+    """Кандидаты из индекса инвентаря, которые пользователь ещё не получал.
+
+    Подписки на каналы здесь не проверяются — их отсекает exclusions.ChannelExclusions.
+    """
+    subq_slot = exists().where(
+        UserSlot.slot_id == PurchasedAdSlot.id,
+        UserSlot.user_id == user_id
+    )
+    return select(PurchasedAdSlot).where(
+        PurchasedAdSlot.id.in_(list(candidate_ids)),
+        PurchasedAdSlot.status == "active",  # Только active, без completing/completed
+        ~subq_slot
+    )
+
+
+def subscribed_channels_stmt(user_id: int):
+    return select(UserSubscribedChannel.channel_username).where(UserSubscribedChannel.user_id == user_id)
+
+
+def lock_users_stmt(user_ids: Iterable[int]):
+    """SELECT ... FOR UPDATE строк users пачки — по возрастанию id, чтобы воркеры не ловили взаимоблокировку.
+
+    Дозаполнение ячеек (BatchAllocator и /api/user_slots) пересчитывает недобор только под этой блокировкой.
+    """
+    return select(User.id).where(User.id.in_(list(user_ids))).order_by(User.id).with_for_update()
+
+
+def slot_deficits_stmt(user_ids: Iterable[int]):
+    """current_slot_count и число видимых UserSlot для пачки пользователей (BatchAllocator)."""
+    return (
+        select(User.id, User.current_slot_count, func.count(UserSlot.id))
+        .outerjoin(UserSlot, and_(
+            UserSlot.user_id == User.id,
+            UserSlot.status.in_(VISIBLE_USER_SLOT_STATUSES)
+        ))
+        .where(User.id.in_(list(user_ids)))
+        .group_by(User.id, User.current_slot_count)
+    )
+
+
+def allocation_slots_stmt(slot_ids: Iterable[int]):
+    return select(
+        PurchasedAdSlot.id,
+        PurchasedAdSlot.channel_username,
+        PurchasedAdSlot.slot_type,
+        PurchasedAdSlot.required_shows,
+        PurchasedAdSlot.current_shows
+    ).where(PurchasedAdSlot.id.in_(list(slot_ids)), PurchasedAdSlot.status == "active")
+
+
+def held_pairs_stmt(user_ids: Iterable[int], slot_ids: Iterable[int]):
+    return select(UserSlot.user_id, UserSlot.slot_id).where(
+        UserSlot.user_id.in_(list(user_ids)),
+        UserSlot.slot_id.in_(list(slot_ids))
+    )
+
+
+def subscribed_pairs_stmt(user_ids: Iterable[int], channel_usernames: Iterable[str]):
+    return select(UserSubscribedChannel.user_id, UserSubscribedChannel.channel_username).where(
+        UserSubscribedChannel.user_id.in_(list(user_ids)),
+        UserSubscribedChannel.channel_username.in_(list(channel_usernames))
+    )
+
+
+def subscribe_channel_stmt(dialect_name: str, user_id: int, slot_id: int):
+    """Запись подписки на канал слота: INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING channel_username.
+
+    Возвращает канал, только если строка вставлена; повторная подписка и слот без канала — пустой результат.
+    """
+    dialect_insert = sqlite.insert if dialect_name == "sqlite" else postgresql.insert
+    source = select(literal(user_id, BigInteger), PurchasedAdSlot.channel_username).where(
+        PurchasedAdSlot.id == slot_id,
+        PurchasedAdSlot.channel_username.isnot(None)
+    )
+    stmt = dialect_insert(UserSubscribedChannel).from_select(
+        [UserSubscribedChannel.user_id, UserSubscribedChannel.channel_username], source
+    ).on_conflict_do_nothing(index_elements=[UserSubscribedChannel.user_id, UserSubscribedChannel.channel_username])
+    return stmt.returning(UserSubscribedChannel.channel_username)
+
+
+def user_slot_stmt(user_id: int, slot_id: int):
+    return select(UserSlot).where(UserSlot.user_id == user_id, UserSlot.slot_id == slot_id)
+
+
+def user_open_slots_stmt(user_id: int):
+    return select(UserSlot).where(
+        UserSlot.user_id == user_id,
+        UserSlot.status.in_(["active", "subscribed"])
+    )
+
+
+def slot_holders_stmt(slot_id: int):
+    """Пользователи, у которых слот виден в /api/user_slots (индекс ix_user_slots_slot_id)."""
+    return select(UserSlot.user_id).where(
+        UserSlot.slot_id == slot_id,
+        UserSlot.status.in_(VISIBLE_USER_SLOT_STATUSES)
+    )
+
+
+def mark_holders_completing_stmt(slot_ids: Iterable[int]):
+    # один UPDATE по индексу slot_id вместо загрузки всех держателей в ORM
+    return (
+        update(UserSlot)
+        .where(UserSlot.slot_id.in_(list(slot_ids)), UserSlot.status.notin_(("completing", "completed")))
+        .values(status="completing")
+        .returning(UserSlot.user_id, UserSlot.slot_id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def completed_user_slots_stmt(limit: int):
+    """Пачка completed-строк для переноса в user_slot_history (частичный индекс ix_user_slots_completed)."""
+    return (
+        select(UserSlot.id, UserSlot.user_id, UserSlot.slot_id, UserSlot.subscribed_at)
+        .where(UserSlot.status == "completed")
+        .order_by(UserSlot.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+
+
+def advertiser_slots_stmt(advertiser_id: int):
+    return (
+        select(PurchasedAdSlot)
+        .where(PurchasedAdSlot.advertiser_id == advertiser_id)
+        .order_by(PurchasedAdSlot.created_at)
+    )
+
+
+def active_inventory_stmt():
+    return select(PurchasedAdSlot.id, PurchasedAdSlot.slot_type).where(PurchasedAdSlot.status == "active")
+
+
+def due_completions_stmt(now: datetime, limit: int):
+    return (
+        select(PurchasedAdSlot.id)
+        .where(
+            PurchasedAdSlot.status == "completing",
+            # complete_at IS NULL — слоты, ушедшие в completing до появления колонки
+            or_(PurchasedAdSlot.complete_at <= now, PurchasedAdSlot.complete_at.is_(None))
+        )
+        .order_by(PurchasedAdSlot.complete_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+
+
+NEW_USER_DEFAULTS = {
+    "level": 1,
+    "free_points": 0,
+    "distributed_points": 0,
+    "ref_points": 0,
+    "payout_bonus": 0,
+    "balance": 0.0,
+    "current_slot_count": 5,
+    "timer_speed_multiplier": 1.0,
+    "payout_rate": 1.0,
+}
+
+
+def new_user_row(user_id: int, **fields) -> dict:
+    return {"id": user_id, **NEW_USER_DEFAULTS, **fields}
+
+
+def insert_user_slots_stmt(dialect_name: str, rows: List[dict]):
+    """INSERT ... ON CONFLICT (user_id, slot_id) DO NOTHING RETURNING slot_id — назначение слотов.
+
+    Пара, которую уже вставил параллельный путь, пропускается без IntegrityError и не возвращается.
+    """
+    dialect_insert = sqlite.insert if dialect_name == "sqlite" else postgresql.insert
+    stmt = dialect_insert(UserSlot).values(rows).on_conflict_do_nothing(
+        index_elements=[UserSlot.user_id, UserSlot.slot_id]
+    )
+    return stmt.returning(UserSlot.user_id, UserSlot.slot_id)
+
+
+def upsert_users_stmt(dialect_name: str, rows: List[dict], fill_names: bool = False):
+    """INSERT ... ON CONFLICT (id) DO NOTHING RETURNING — создание пользователя одним запросом.
+
+    Уже существующие строки не трогаются и не возвращаются. fill_names=True дописывает
+    username/first_name только там, где их ещё нет (пользователя мог создать /api/user без них).
+    SQLite (тесты, локальный запуск) понимает тот же ON CONFLICT, нужен лишь свой insert().
+    """
+    dialect_insert = sqlite.insert if dialect_name == "sqlite" else postgresql.insert
+    stmt = dialect_insert(User).values(rows)
+    if fill_names:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.id],
+            set_={
+                "username": func.coalesce(User.username, stmt.excluded.username),
+                "first_name": func.coalesce(User.first_name, stmt.excluded.first_name),
+            },
+            where=or_(
+                and_(User.username.is_(None), stmt.excluded.username.isnot(None)),
+                and_(User.first_name.is_(None), stmt.excluded.first_name.isnot(None)),
+            ),
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[User.id])
+    return stmt.returning(*User.__table__.columns)
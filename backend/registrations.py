@@ -0,0 +1,61 @@
+# backend/registrations.py
+import os
+import logging
+from typing import Dict, Optional
+
+from cache import user_cache
+from queries import new_user_row, upsert_users_stmt
+from background import BackgroundLoop
+
+logger = logging.getLogger(__name__)
+
+USER_REGISTRATION_BATCH = int(os.getenv("USER_REGISTRATION_BATCH", "500"))  # пользователей на один INSERT
+
+
+class UserRegistrations(BackgroundLoop):
+    """Отложенная регистрация пользователей, открывших мини-апп (GET /).
+
+    Корневая страница больше не ходит в БД: user_id с username/first_name из initData
+    попадают сюда, а фоновая задача вставляет их пачкой одним
+    INSERT ... ON CONFLICT DO UPDATE (только недостающие имена) — существующие строки не переписываются.
+    """
+
+    def __init__(self, session_factory, batch: int = USER_REGISTRATION_BATCH):
+        super().__init__()
+        self._session_factory = session_factory
+        self.batch = batch
+        self._pending: Dict[int, dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def schedule(self, user_id: int, username: Optional[str] = None, first_name: Optional[str] = None) -> None:
+        self._pending[user_id] = new_user_row(user_id, username=username, first_name=first_name)
+        self.wake()
+
+    async def flush(self) -> int:
+        # по возрастанию id: параллельные воркеры берут блокировки строк в одном порядке
+        batch = sorted(self._pending)[:self.batch]
+        rows = [self._pending.pop(user_id) for user_id in batch]
+        if not rows:
+            return 0
+        try:
+            async with self._session_factory() as db:
+                res = await db.execute(upsert_users_stmt(db.get_bind().dialect.name, rows, fill_names=True))
+                written = res.scalars().all()
+                await db.commit()
+        except Exception:
+            # не критично: /api/user и /api/bootstrap создадут пользователя сами при первом обращении
+            logger.exception("User registration failed for %s users", len(rows))
+            return 0
+        # в кэше могли остаться снимки без username/first_name
+        for user_id in written:
+            user_cache.invalidate(user_id)
+        return len(rows)
+
+    async def step(self) -> bool:
+        return bool(await self.flush())
+
+    async def drain(self) -> None:
+        while await self.flush():
+            pass
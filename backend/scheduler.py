@@ -0,0 +1,175 @@
+# backend/scheduler.py
+import os
+import logging
+from datetime import datetime, timedelta, timezone
+from collections import defaultdict
+from typing import List, Set
+
+from sqlalchemy import update, delete, insert
+
+from models import PurchasedAdSlot, UserSlot, UserSlotHistory
+from events import event_bus
+from inventory import slot_inventory
+from cache import user_cache
+from background import BackgroundLoop
+from queries import due_completions_stmt, mark_holders_completing_stmt, completed_user_slots_stmt
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SLOT_COMPLETION_DELAY = int(os.getenv("SLOT_COMPLETION_DELAY", "60"))  # 60 для теста, в проде 600 (10 мин)
+COMPLETION_SWEEP_INTERVAL = float(os.getenv("COMPLETION_SWEEP_INTERVAL", "5"))
+COMPLETION_SWEEP_BATCH = int(os.getenv("COMPLETION_SWEEP_BATCH", "500"))
+USER_SLOT_COMPACT_INTERVAL = float(os.getenv("USER_SLOT_COMPACT_INTERVAL", "60"))
+USER_SLOT_COMPACT_BATCH = int(os.getenv("USER_SLOT_COMPACT_BATCH", "5000"))
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def completion_deadline() -> datetime:
+    return utcnow() + timedelta(seconds=SLOT_COMPLETION_DELAY)
+
+
+class CompletingCascade(BackgroundLoop):
+    """Перевод UserSlot достигших порога слотов в completing — вне запроса подписчика.
+
+    subscribe_slot только ставит slot_id в очередь; фоновая задача одним UPDATE
+    переводит всех держателей пачки слотов. Если процесс упадёт раньше, ничего
+    не теряется: по complete_at CompletionSweeper переведёт эти UserSlot в completed,
+    а UserSlotCompactor перенесёт их в user_slot_history.
+    """
+
+    def __init__(self, session_factory, retry_interval: float = COMPLETION_SWEEP_INTERVAL):
+        # по интервалу — только повтор пачки, вернувшейся в очередь после ошибки
+        super().__init__(retry_interval)
+        self._session_factory = session_factory
+        self._pending: Set[int] = set()
+
+    def schedule(self, slot_id: int) -> None:
+        self._pending.add(slot_id)
+        self.wake()
+
+    async def flush(self) -> int:
+        slot_ids, self._pending = self._pending, set()
+        if not slot_ids:
+            return 0
+        try:
+            async with self._session_factory() as db:
+                res = await db.execute(mark_holders_completing_stmt(slot_ids))
+                holders = res.all()
+                await db.commit()
+        except Exception:
+            logger.exception("Completing cascade failed, %s slots re-queued", len(slot_ids))
+            self._pending |= slot_ids
+            return 0
+
+        by_slot = defaultdict(list)
+        for user_id, slot_id in holders:
+            by_slot[slot_id].append(user_id)
+            # timer_running держателя мог измениться — не отдавать устаревший снимок из кэша
+            user_cache.invalidate(user_id)
+        for slot_id, user_ids in by_slot.items():
+            event_bus.publish_many(user_ids, {"type": "slots", "reason": "completing", "slot_id": slot_id})
+        return len(holders)
+
+    async def step(self) -> bool:
+        # новые slot_id, пришедшие во время flush, уже взвели wake()
+        await self.flush()
+        return False
+
+    async def drain(self) -> None:
+        await self.flush()
+
+
+class CompletionSweeper(BackgroundLoop):
+    """Один цикл на процесс вместо asyncio.sleep на каждый completing-слот.
+
+    Дедлайн хранится в purchased_slots.complete_at, поэтому после рестарта
+    сканирование просто продолжается. Каждый тик — одна транзакция: слот и его
+    UserSlot переходят в completed вместе; в историю строки переносит UserSlotCompactor.
+    """
+
+    def __init__(self, session_factory, interval: float = COMPLETION_SWEEP_INTERVAL,
+                 batch_size: int = COMPLETION_SWEEP_BATCH, allocator=None):
+        super().__init__(interval)
+        self._session_factory = session_factory
+        self.batch_size = batch_size
+        # BatchAllocator: освободившиеся ячейки держателей дозаполняются одним проходом
+        self._allocator = allocator
+
+    async def tick(self) -> List[int]:
+        async with self._session_factory() as db:
+            due = due_completions_stmt(utcnow(), self.batch_size)
+            done_res = await db.execute(
+                update(PurchasedAdSlot)
+                .where(PurchasedAdSlot.id.in_(due.scalar_subquery()))
+                .values(status="completed")
+                .returning(PurchasedAdSlot.id)
+                .execution_options(synchronize_session=False)
+            )
+            slot_ids = done_res.scalars().all()
+            if not slot_ids:
+                return []
+
+            released = await db.execute(
+                update(UserSlot)
+                .where(UserSlot.slot_id.in_(slot_ids), UserSlot.status != "completed")
+                .values(status="completed")
+                .returning(UserSlot.user_id, UserSlot.slot_id)
+                .execution_options(synchronize_session=False)
+            )
+            holders = released.all()
+            await db.commit()
+
+        metrics.slot_completions.inc(len(slot_ids))
+        for slot_id in slot_ids:
+            slot_inventory.remove(slot_id)
+        for user_id, slot_id in holders:
+            event_bus.publish(user_id, {"type": "slots", "reason": "completed", "slot_id": slot_id})
+        if self._allocator is not None and holders:
+            self._allocator.schedule(user_id for user_id, _ in holders)
+        logger.info("Completed %s slots, released %s user slots", len(slot_ids), len(holders))
+        return slot_ids
+
+    async def step(self) -> bool:
+        # полный батч — сразу следующий тик, иначе ждём интервал
+        return len(await self.tick()) >= self.batch_size
+
+
+class UserSlotCompactor(BackgroundLoop):
+    """Переносит completed-строки из горячей user_slots в user_slot_history пачками.
+
+    Перенос пачки — одна транзакция (SELECT ... FOR UPDATE SKIP LOCKED, INSERT, DELETE),
+    так что строка не может оказаться в обеих таблицах или пропасть, и несколько
+    воркеров не мешают друг другу.
+    """
+
+    def __init__(self, session_factory, interval: float = USER_SLOT_COMPACT_INTERVAL,
+                 batch_size: int = USER_SLOT_COMPACT_BATCH):
+        super().__init__(interval)
+        self._session_factory = session_factory
+        self.batch_size = batch_size
+
+    async def tick(self) -> int:
+        async with self._session_factory() as db:
+            res = await db.execute(completed_user_slots_stmt(self.batch_size))
+            rows = [row._asdict() for row in res.all()]
+            if not rows:
+                return 0
+            await db.execute(insert(UserSlotHistory), rows)
+            await db.execute(
+                delete(UserSlot)
+                .where(UserSlot.id.in_([row["id"] for row in rows]))
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        metrics.user_slots_archived.inc(len(rows))
+        return len(rows)
+
+    async def step(self) -> bool:
+        moved = await self.tick()
+        if moved:
+            logger.info("Archived %s completed user slots", moved)
+        return moved >= self.batch_size
@@ -0,0 +1,91 @@
+# backend/slot_import.py
+import os
+import json
+from typing import AsyncIterator, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import PurchasedAdSlot
+
+SLOT_BULK_BATCH = int(os.getenv("SLOT_BULK_BATCH", "1000"))  # строк на один executemany
+SLOT_BULK_MAX = int(os.getenv("SLOT_BULK_MAX", "50000"))  # слотов на один запрос
+
+SLOT_TYPES = ("standard", "vip", "premium")
+
+
+class SlotValidationError(ValueError):
+    def __init__(self, index: int, message: str):
+        super().__init__(f"slot #{index}: {message}")
+        self.index = index
+        self.message = message
+
+
+def _text(payload: dict, key: str, default: str, index: int) -> str:
+    value = payload.get(key, default)
+    if not isinstance(value, str):
+        raise SlotValidationError(index, f"{key} must be a string")
+    return value
+
+
+def slot_row(payload, index: int = 0) -> dict:
+    """Параметры INSERT для одного слота — те же значения по умолчанию, что и у POST /api/slot."""
+    if not isinstance(payload, dict):
+        raise SlotValidationError(index, "expected an object")
+    advertiser_id = payload.get("advertiser_id", 0)
+    required_shows = payload.get("required_shows", 1000)
+    slot_type = payload.get("slot_type", "standard")
+    if not isinstance(advertiser_id, int) or isinstance(advertiser_id, bool):
+        raise SlotValidationError(index, "advertiser_id must be an integer")
+    if not isinstance(required_shows, int) or isinstance(required_shows, bool) or required_shows <= 0:
+        raise SlotValidationError(index, "required_shows must be a positive integer")
+    if slot_type not in SLOT_TYPES:
+        raise SlotValidationError(index, f"slot_type must be one of {', '.join(SLOT_TYPES)}")
+    return {
+        "advertiser_id": advertiser_id,
+        "channel_username": _text(payload, "channel_username", "unknown", index),
+        "channel_name": _text(payload, "channel_name", "unknown", index),
+        "link": _text(payload, "link", "", index),
+        "slot_type": slot_type,
+        "required_shows": required_shows,
+        "price_paid": 0,
+        "status": "active",
+    }
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Optional[dict]]]:
+    """Разбор NDJSON по мере чтения тела запроса — весь payload в памяти не держим."""
+    buffer = b""
+    index = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield index, _parse_line(line, index)
+                index += 1
+    if buffer.strip():
+        yield index, _parse_line(buffer, index)
+
+
+def _parse_line(line: bytes, index: int):
+    try:
+        return json.loads(line)
+    except ValueError:
+        raise SlotValidationError(index, "invalid JSON")
+
+
+async def insert_slots(db: AsyncSession, rows: List[dict]) -> List[Tuple[int, str]]:
+    """Один INSERT ... RETURNING на пачку: SQLAlchemy разворачивает его в multi-row VALUES (insertmanyvalues)."""
+    if not rows:
+        return []
+    res = await db.execute(
+        insert(PurchasedAdSlot).returning(PurchasedAdSlot.id, PurchasedAdSlot.slot_type, sort_by_parameter_order=True),
+        rows,
+    )
+    return [tuple(row) for row in res.all()]
+
+
+async def iter_json_array(payload: list) -> AsyncIterator[Tuple[int, Optional[dict]]]:
+    for index, item in enumerate(payload):
+        yield index, item
@@ -0,0 +1,67 @@
+# backend/startup.py
+import os
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# Прод-режим запуска: без create_all и без лишних вызовов Telegram API на каждом рестарте
+FAST_START = os.getenv("FAST_START", "0") == "1"
+ALEMBIC_INI = Path(__file__).parent / "alembic.ini"
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+class StartupTimer:
+    """Длительность фаз старта (импорт модуля и шаги lifespan) — для логов, /health и bench.startup."""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.perf_counter() - started, 6)
+
+    def record(self, name: str, seconds: float) -> None:
+        self.phases[name] = round(seconds, 6)
+
+
+def log_task_failure(task: asyncio.Task) -> None:
+    """add_done_callback для фоновых задач старта: иначе исключение всплывёт только в сборщике мусора."""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Background task %s failed", task.get_name(), exc_info=task.exception())
+
+
+def alembic_heads() -> set:
+    # alembic нужен только при FAST_START=1 — не грузим его на каждом старте
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("script_location", str(ALEMBIC_INI.parent / "alembic"))
+    return set(ScriptDirectory.from_config(config).get_heads())
+
+
+async def check_schema_at_head(engine) -> None:
+    """Вместо create_all: схема должна быть накатана `alembic upgrade head` до старта."""
+    from alembic.runtime.migration import MigrationContext
+
+    expected = alembic_heads()
+    async with engine.connect() as conn:
+        current = set(await conn.run_sync(lambda sync_conn: MigrationContext.configure(sync_conn).get_current_heads()))
+    if current != expected:
+        raise SchemaOutOfDate(
+            f"Database schema is at {sorted(current) or 'no revision'}, expected {sorted(expected)}: "
+            "run `alembic upgrade head` before starting with FAST_START=1"
+        )
+    logger.info("Database schema at alembic head %s", ", ".join(sorted(current)))
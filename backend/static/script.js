@@ -244,14 +244,28 @@ function initUpgradePage(){
   const buyPayout = document.getElementById('buyPayout');
   if (buyPayout){
     setCursor(buyPayout);
-    buyPayout.onclick = ()=>{ /* as before */ 
-      const cost = parseInt(document.getElementById('payoutCost')?.textContent || '10', 10);
-      if ((user.balance||0) >= cost) {
-        user.balance -= cost;
-        user.currentPayout = (user.currentPayout||10) + 1;
+    // баланс списывает сервер: локальное списание затёр бы следующий progress-ответ
+    buyPayout.onclick = async ()=>{
+      const userId = tg.initDataUnsafe?.user?.id;
+      if (!userId) return;
+      try {
+        const res = await fetch(`/api/user/${userId}/buy_payout`, {
+          method: 'POST',
+          headers: { 'X-Telegram-WebApp-InitData': tg.initData || '' }
+        });
+        if (res.status === 400) { tg.showAlert && tg.showAlert('Недостаточно звёзд!'); return; }
+        if (!res.ok) { console.warn('buy payout fail', res.status); tg.showAlert && tg.showAlert('Ошибка покупки'); return; }
+        const data = await res.json();
+        user.payout_rate = data.payout_rate;
+        user.payoutBonus = data.payout_bonus;
+        user.currentPayout = data.payout_per_cycle;
+        safeText('currentPayout', data.payout_per_cycle);
+        applyProgress(data);
         tg.showAlert && tg.showAlert('Выплата увеличена!');
-        updateMain();
-      } else tg.showAlert && tg.showAlert('Недостаточно звёзд!');
+      } catch (e) {
+        console.error('Network error buy payout', e);
+        tg.showAlert && tg.showAlert('Ошибка сети при покупке');
+      }
     };
   }
 
@@ -379,23 +393,91 @@ function initBuyPage(){
 
 
 // ==================== API integration ====================
+function mapUserSlot(s) {
+    return {
+        slot_id: s.slot_id,
+        channel_username: s.title,
+        link: s.link,
+        type: s.type,
+        status: s.status,
+        expires: null
+    };
+}
+
+function mapPurchasedSlot(s) {
+    return {
+        id: s.id,
+        channel_username: s.channel_username,
+        channel_name: s.channel_name,
+        link: s.link,
+        type: s.type,
+        status: s.status,
+        required_shows: s.required_shows,
+        current_shows: s.current_shows,
+        price_paid: s.price_paid
+    };
+}
+
+function applyUserData(data) {
+    user = {
+      level: data.level || 1,
+      freePoints: data.free_points || 0,
+      refPoints: data.ref_points || 0,
+      payoutBonus: data.payout_bonus || 0,
+      balance: data.balance || 0.0,
+      progress: data.timer_progress || data.checkpoint_progress || 0,
+      boostLevel: data.current_boost_level || 0,
+      adSlots: [],
+      subSlots: Array(data.current_slot_count || 5).fill(null).map((_,i)=>({ id:i, status:'empty', expires:null })),
+      current_slot_count: data.current_slot_count || 5,
+      timer_speed_multiplier: data.timer_speed_multiplier || 1.0,
+      payout_rate: data.payout_rate || 1.0,
+      timer_running: data.timer_running || false
+    };
+}
+
+// Запуск одним запросом: пользователь + его слоты + купленные слоты
+async function fetchBootstrap() {
+    const userId = tg.initDataUnsafe?.user?.id;
+    if (!userId) return null;
+    try {
+        const res = await fetch(`/api/bootstrap/${userId}`, {
+            headers: { 'X-Telegram-WebApp-InitData': tg.initData || '' }
+        });
+        if (!res.ok) {
+            console.warn('API bootstrap', res.status);
+            return null;
+        }
+        return await res.json();
+    } catch (e) {
+        console.warn('fetchBootstrap error', e);
+        return null;
+    }
+}
+
+// Условный GET: если состояние не менялось, сервер отвечает 304 и мы берём прошлый ответ
+const conditionalCache = {};
+async function fetchJsonConditional(url, headers = {}) {
+    const cached = conditionalCache[url];
+    const res = await fetch(url, { headers: cached ? { ...headers, 'If-None-Match': cached.etag } : headers });
+    if (res.status === 304 && cached) return cached.data;
+    if (!res.ok) return null;
+    const data = await res.json();
+    const etag = res.headers.get('ETag');
+    if (etag) conditionalCache[url] = { etag, data };
+    else delete conditionalCache[url];
+    return data;
+}
+
 async function fetchUserSlots() {
     const userId = tg.initDataUnsafe?.user?.id;
     if (!userId) return [];
     try {
-        const res = await fetch(`/api/user_slots/${userId}`, {
-          headers: { 'X-Telegram-WebApp-InitData': tg.initData || '' }
+        const data = await fetchJsonConditional(`/api/user_slots/${userId}`, {
+          'X-Telegram-WebApp-InitData': tg.initData || ''
         });
-        if (!res.ok) return [];
-        const data = await res.json();
-        return data.map(s => ({
-            slot_id: s.slot_id,
-            channel_username: s.title,
-            link: s.link,
-            type: s.type,
-            status: s.status,
-            expires: null
-        }));
+        if (!data) return [];
+        return data.map(mapUserSlot);
     } catch (e) {
         console.warn('fetchUserSlots error', e);
         return [];
@@ -412,17 +494,7 @@ async function fetchPurchasedSlots() {
         });
         if (!res.ok) return [];
         const data = await res.json();
-        return data.map(s => ({
-            id: s.id,
-            channel_username: s.channel_username,
-            channel_name: s.channel_name,
-            link: s.link,
-            type: s.type,
-            status: s.status,
-            required_shows: s.required_shows,
-            current_shows: s.current_shows,
-            price_paid: s.price_paid
-        }));
+        return data.map(mapPurchasedSlot);
     } catch (e) {
         console.warn('fetchPurchasedSlots error', e);
         return [];
@@ -488,9 +560,7 @@ async function fetchUserProgress() {
     const userId = tg.initDataUnsafe?.user?.id;
     if (!userId) return null;
     try {
-        const res = await fetch(`/api/user_progress/${userId}`);
-        if (!res.ok) return null;
-        return await res.json();
+        return await fetchJsonConditional(`/api/user_progress/${userId}`);
     } catch (e) {
         return null;
     }
@@ -573,7 +643,7 @@ function renderAdSlots() {
   }
 }
 
-// ==================== Timer (local) ====================
+// ==================== Timer (local animation, server-authoritative) ====================
 let timerInterval = null;
 function startTimer() {
     if (timerInterval) return;
@@ -582,18 +652,10 @@ function startTimer() {
     timerInterval = setInterval(() => {
         user.progress = (user.progress || 0) + (user.timer_speed_multiplier || 1) * 0.1;
         if (user.progress >= 100) {
-            clearInterval(timerInterval);
-            timerInterval = null;
-            user.progress = 0;
-            user.balance = (user.balance || 0) + ((user.payout_rate || 1) * 10);
-            tg.showAlert && tg.showAlert('Цикл завершён! +10 ⭐');
-            // Persist progress=0 and balance to backend
-            const userId = tg.initDataUnsafe?.user?.id || 0;
-            fetch(`/api/user/${userId}`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json', 'X-Telegram-WebApp-InitData': tg.initData || '' },
-                body: JSON.stringify({ checkpoint_progress: 0, timer_progress: 0, balance: user.balance })
-            }).catch(()=>{});
+            user.progress -= 100;
+            tg.showAlert && tg.showAlert(`Цикл завершён! +${(user.payout_rate || 1) * 10} ⭐`);
+            // Баланс и прогресс считает сервер — просто сверяемся с ним, без записи
+            fetchUserProgress().then(applyProgress);
         }
         updateTimerProgress();
     }, 1000);
@@ -603,38 +665,32 @@ function startTimer() {
 document.addEventListener('DOMContentLoaded', async ()=>{
   initStatsToggle();
 
-  const userId = tg.initDataUnsafe?.user?.id;
-  if (userId){
-    try {
-      const r = await fetch(`/api/user/${userId}`, {
-        method: 'GET',
-        headers: { 'X-Telegram-WebApp-InitData': tg.initData || '' }
-      });
-      if (r.ok){
-        const data = await r.json();
-        if (data.new_user) tg.showAlert && tg.showAlert('Аккаунт создан! Добро пожаловать!');
-        user = {
-          level: data.level || 1,
-          freePoints: data.free_points || 0,
-          refPoints: data.ref_points || 0,
-          payoutBonus: data.payout_bonus || 0,
-          balance: data.balance || 0.0,
-          progress: data.timer_progress || data.checkpoint_progress || 0,
-          boostLevel: data.current_boost_level || 0,
-          adSlots: [],
-          subSlots: Array(data.current_slot_count || 5).fill(null).map((_,i)=>({ id:i, status:'empty', expires:null })),
-          current_slot_count: data.current_slot_count || 5,
-          timer_speed_multiplier: data.timer_speed_multiplier || 1.0,
-          payout_rate: data.payout_rate || 1.0,
-          timer_running: data.timer_running || false
-        };
-      } else {
-        console.warn('API user fetch', r.status);
-      }
-    } catch (e) { console.warn('fetch user fail', e); }
+  const boot = await fetchBootstrap();
+  if (boot){
+    if (boot.user.new_user) tg.showAlert && tg.showAlert('Аккаунт создан! Добро пожаловать!');
+    applyUserData(boot.user);
+    user.subSlots = boot.user_slots.map(mapUserSlot);
+    user.adSlots = boot.purchased_slots.map(mapPurchasedSlot);
+    renderAdSlots();
+    renderHomeSlotsList();
+  } else {
+    // запасной путь — прежняя последовательность запросов
+    const userId = tg.initDataUnsafe?.user?.id;
+    if (userId){
+      try {
+        const r = await fetch(`/api/user/${userId}`, {
+          method: 'GET',
+          headers: { 'X-Telegram-WebApp-InitData': tg.initData || '' }
+        });
+        if (r.ok){
+          applyUserData(await r.json());
+        } else {
+          console.warn('API user fetch', r.status);
+        }
+      } catch (e) { console.warn('fetch user fail', e); }
+    }
+    await loadSlots();
   }
-
-  await loadSlots();
   updateMain();
   initUpgradePage();
 
@@ -646,18 +702,52 @@ document.addEventListener('DOMContentLoaded', async ()=>{
 
   initBuyPage();
 
-  // Polling: refresh slots + progress every 3s
-  setInterval(async () => {
-    await loadSlots();
-    const prog = await fetchUserProgress();
-    if (prog) {
-      // only overwrite local progress if backend has a believable value
-      if (typeof prog.timer_progress === 'number') user.progress = prog.timer_progress;
-      if (typeof prog.timer_running === 'boolean') user.timer_running = prog.timer_running;
-      // if backend reports running true and timer not started locally -> start local timer
-      if (user.timer_running && !timerInterval) startTimer();
-      if (!user.timer_running && timerInterval) { clearInterval(timerInterval); timerInterval = null; }
-      updateTimerProgress();
-    }
-  }, 3000);
-});
\ No newline at end of file
+  // Push-канал (SSE); polling каждые 3с — только пока соединение разорвано
+  connectEvents();
+});
+
+// ==================== Push / polling fallback ====================
+let pollInterval = null;
+let eventSource = null;
+
+function applyProgress(prog) {
+  if (!prog) return;
+  // only overwrite local progress if backend has a believable value
+  if (typeof prog.timer_progress === 'number') user.progress = prog.timer_progress;
+  if (typeof prog.timer_running === 'boolean') user.timer_running = prog.timer_running;
+  if (typeof prog.balance === 'number') { user.balance = prog.balance; updateMain(); }
+  // if backend reports running true and timer not started locally -> start local timer
+  if (user.timer_running && !timerInterval) startTimer();
+  if (!user.timer_running && timerInterval) { clearInterval(timerInterval); timerInterval = null; }
+  updateTimerProgress();
+}
+
+async function pollOnce() {
+  await loadSlots();
+  applyProgress(await fetchUserProgress());
+}
+
+function startPolling() {
+  if (pollInterval) return;
+  pollInterval = setInterval(pollOnce, 3000);
+}
+
+function stopPolling() {
+  if (pollInterval) { clearInterval(pollInterval); pollInterval = null; }
+}
+
+function connectEvents() {
+  const userId = tg.initDataUnsafe?.user?.id;
+  if (!userId || !window.EventSource) { startPolling(); return; }
+  if (eventSource) eventSource.close();
+
+  eventSource = new EventSource(`/api/events/${userId}?init_data=${encodeURIComponent(tg.initData || '')}`);
+  // "ready" приходит при каждом (пере)подключении — догоняем пропущенное и выключаем polling
+  eventSource.addEventListener('ready', () => { stopPolling(); pollOnce(); });
+  eventSource.addEventListener('slots', () => loadSlots());
+  eventSource.addEventListener('progress', (e) => {
+    try { applyProgress(JSON.parse(e.data)); } catch (err) {}
+  });
+  // EventSource сам переподключается; пока его нет — работаем по старому polling
+  eventSource.onerror = () => startPolling();
+}
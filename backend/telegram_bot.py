@@ -0,0 +1,91 @@
+# backend/telegram_bot.py
+# python-telegram-bot заметно замедляет импорт — он подгружается только при первом обращении к боту
+import asyncio
+import logging
+from typing import Optional
+
+from webhook_queue import UpdateQueue, REJECTED
+
+logger = logging.getLogger(__name__)
+
+
+def _build_application(token: str, web_app_url: str):
+    from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
+    from telegram.constants import ParseMode
+    from telegram.ext import Application, CommandHandler, CallbackContext
+
+    async def start(update: Update, context: CallbackContext):
+        keyboard = [[InlineKeyboardButton("Играть", web_app=WebAppInfo(url=web_app_url))]]
+        await update.message.reply_text(
+            "Привет! Это <b>MellStarGame</b>\nНажми «Играть»!",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode=ParseMode.HTML
+        )
+
+    application = Application.builder().token(token).build()
+    application.add_handler(CommandHandler("start", start))
+    return application
+
+
+class TelegramBot:
+    """Application создаётся и инициализируется при первом обращении, а не при импорте main."""
+
+    def __init__(self, token: Optional[str], webhook_url: Optional[str], web_app_url: str):
+        self.token = token
+        self.webhook_url = webhook_url
+        self.web_app_url = web_app_url
+        self._application = None
+        self._lock = asyncio.Lock()
+        # /webhook только ставит апдейт в очередь, process_update выполняют фоновые воркеры
+        self.queue: Optional[UpdateQueue] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token)
+
+    async def application(self):
+        if self._application is None:
+            async with self._lock:
+                if self._application is None:
+                    application = _build_application(self.token, self.web_app_url)
+                    await application.initialize()
+                    self.queue = UpdateQueue(application.process_update)
+                    self.queue.start()
+                    self._application = application
+        return self._application
+
+    async def reset_webhook(self) -> None:
+        """Старое поведение: при каждом старте сбросить очередь Telegram и заново выставить webhook."""
+        application = await self.application()
+        await application.bot.delete_webhook(drop_pending_updates=True)
+        await application.bot.set_webhook(url=self.webhook_url)
+
+    async def sync_webhook(self) -> bool:
+        """Выставить webhook, только если он отличается; накопившиеся апдейты не сбрасываются."""
+        application = await self.application()
+        info = await application.bot.get_webhook_info()
+        if info.url == self.webhook_url:
+            logger.info("Webhook already set, skipping set_webhook")
+            return False
+        await application.bot.set_webhook(url=self.webhook_url)
+        logger.info("Webhook updated: %r -> %r", info.url, self.webhook_url)
+        return True
+
+    async def submit(self, update_json: dict) -> Optional[str]:
+        """Разобрать апдейт и поставить в очередь; None — апдейт пустой."""
+        from telegram import Update
+
+        application = await self.application()
+        update = Update.de_json(update_json, application.bot)
+        if not update:
+            return None
+        if self.queue is None:
+            return REJECTED  # идёт остановка
+        return self.queue.submit(update.update_id, update)
+
+    async def shutdown(self) -> None:
+        # сначала дослить апдейты: их обработчики ещё пользуются application и БД
+        if self.queue:
+            await self.queue.stop()
+        if self._application is not None:
+            await self._application.shutdown()
@@ -0,0 +1,115 @@
+# backend/tests/conftest.py
+# Тесты гоняются на SQLite (aiosqlite): database.py создаёт engine при импорте,
+# поэтому окружение выставляется до импорта модулей приложения.
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+_DB_DIR = tempfile.mkdtemp(prefix="mell-tests-")
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_DB_DIR}/test.db"
+os.environ.pop("BOT_TOKEN", None)
+os.environ.pop("WEBHOOK_URL", None)
+os.environ["FAST_START"] = "0"
+os.chdir(BACKEND_DIR)  # StaticFiles(directory="static") в main.py — относительный путь
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from database import engine, AsyncSessionLocal  # noqa: E402
+from models import Base, User, PurchasedAdSlot  # noqa: E402
+from cache import user_cache  # noqa: E402
+from versions import state_versions, StateVersions  # noqa: E402
+from inventory import slot_inventory, SlotInventory  # noqa: E402
+from exclusions import channel_exclusions  # noqa: E402
+import main  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+def _reset_process_state() -> None:
+    user_cache._snapshots.clear()
+    channel_exclusions._filters.clear()
+    state_versions.__dict__.update(StateVersions().__dict__)
+    slot_inventory.__dict__.update(SlotInventory().__dict__)
+    main.candidate_queues.__dict__.update(type(main.candidate_queues)(AsyncSessionLocal).__dict__)
+    main.batch_allocator._pending.clear()
+    main.user_write_buffer._pending.clear()
+    main.user_registrations._pending.clear()
+
+
+@pytest.fixture
+async def db_schema(anyio_backend):
+    """Чистая схема и чистые in-process кэши на каждый тест."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    _reset_process_state()
+    yield AsyncSessionLocal
+    # соединения aiosqlite привязаны к циклу событий теста
+    await engine.dispose()
+
+
+@pytest.fixture
+async def session(db_schema):
+    async with db_schema() as db:
+        yield db
+
+
+@pytest.fixture
+async def client(db_schema):
+    # без lifespan: фоновые циклы не стартуют, тест сам вызывает flush()/tick()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        yield http
+
+
+@pytest.fixture
+def count_queries():
+    """with count_queries() as statements: ... — SQL, выполненный внутри блока."""
+    @contextmanager
+    def counter():
+        statements = []
+
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine.sync_engine, "before_cursor_execute", _before)
+        try:
+            yield statements
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", _before)
+
+    return counter
+
+
+async def add_user(db, user_id: int, **fields) -> User:
+    user = User(id=user_id, **{
+        "level": 1, "free_points": 0, "distributed_points": 0, "ref_points": 0, "payout_bonus": 0,
+        "balance": 0.0, "current_slot_count": 5, "timer_speed_multiplier": 1.0, "payout_rate": 1.0,
+        **fields,
+    })
+    db.add(user)
+    await db.commit()
+    return user
+
+
+async def add_slots(db, count: int, prefix: str = "channel_", **fields) -> list:
+    slots = [
+        PurchasedAdSlot(**{
+            "advertiser_id": 1, "channel_username": f"{prefix}{i}", "channel_name": f"Channel {prefix}{i}",
+            "link": f"https://t.me/{prefix}{i}", "slot_type": "standard", "required_shows": 100,
+            "current_shows": 0, "price_paid": 0, "status": "active", **fields,
+        })
+        for i in range(count)
+    ]
+    db.add_all(slots)
+    await db.commit()
+    await slot_inventory.load(db)
+    return slots
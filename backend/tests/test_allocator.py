@@ -0,0 +1,56 @@
+# backend/tests/test_allocator.py
+import pytest
+from sqlalchemy import func, select
+
+import main
+from models import UserSlot
+from queries import insert_user_slots_stmt
+from conftest import add_user, add_slots
+
+pytestmark = pytest.mark.anyio
+
+
+async def _held(db, user_id: int) -> list:
+    res = await db.execute(select(UserSlot.slot_id).where(UserSlot.user_id == user_id).order_by(UserSlot.slot_id))
+    return res.scalars().all()
+
+
+async def test_allocator_fills_deficits_with_distinct_channels(session):
+    await add_user(session, 1, current_slot_count=3)
+    await add_user(session, 2, current_slot_count=2)
+    await add_slots(session, 10)
+
+    main.batch_allocator.schedule([1, 2])
+    assert await main.batch_allocator.flush() == 2
+
+    for user_id, count in ((1, 3), (2, 2)):
+        held = await _held(session, user_id)
+        assert len(held) == len(set(held)) == count
+
+
+async def test_user_slots_recounts_after_allocator_filled_the_user(client, session):
+    await add_user(session, 1, current_slot_count=2)
+    await add_slots(session, 10)
+    # снимок с недобором уже в кэше — как у запроса, стартовавшего до прохода аллокатора
+    assert (await client.get("/api/user/1")).status_code == 200
+
+    main.batch_allocator.schedule([1])
+    await main.batch_allocator.flush()
+    res = await client.get("/api/user_slots/1")
+
+    assert res.status_code == 200 and len(res.json()) == 2
+    assert len(await _held(session, 1)) == 2
+
+
+async def test_duplicate_user_slot_pair_is_skipped(session):
+    await add_user(session, 1)
+    slots = await add_slots(session, 2)
+    rows = [{"user_id": 1, "slot_id": slot.id, "status": "active"} for slot in slots]
+    dialect = session.get_bind().dialect.name
+
+    await session.execute(insert_user_slots_stmt(dialect, rows[:1]))
+    res = await session.execute(insert_user_slots_stmt(dialect, rows))
+    await session.commit()
+
+    assert res.all() == [(1, slots[1].id)]
+    assert await session.scalar(select(func.count()).select_from(UserSlot)) == 2
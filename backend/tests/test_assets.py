@@ -0,0 +1,55 @@
+# backend/tests/test_assets.py
+import pytest
+
+from assets import asset_pipeline
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def script_url():
+    asset_pipeline.build()
+    return asset_pipeline.urls["script.js"]
+
+
+def varies_on_encoding(res) -> bool:
+    # CORSMiddleware дописывает в Vary ещё и Origin
+    return "Accept-Encoding" in {part.strip() for part in res.headers["Vary"].split(",")}
+
+
+async def _get(client, url, encoding, etag=None):
+    headers = {"Accept-Encoding": encoding}
+    if etag:
+        headers["If-None-Match"] = etag
+    return await client.get(url, headers=headers)
+
+
+async def test_each_encoding_has_its_own_etag(client, script_url):
+    identity = await _get(client, script_url, "identity")
+    gzipped = await _get(client, script_url, "gzip")
+
+    assert "Content-Encoding" not in identity.headers
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzipped.headers["ETag"] == identity.headers["ETag"][:-1] + '-gz"'
+    assert varies_on_encoding(identity) and varies_on_encoding(gzipped)
+
+
+async def test_etag_of_another_encoding_is_not_a_match(client, script_url):
+    gz_etag = (await _get(client, script_url, "gzip")).headers["ETag"]
+
+    res = await _get(client, script_url, "identity", etag=gz_etag)
+
+    assert res.status_code == 200
+    assert res.content == (asset_pipeline.static_dir / "script.js").read_bytes()
+
+
+@pytest.mark.parametrize("path", ["script", "/"])
+async def test_matching_etag_answers_304(client, script_url, path):
+    url = script_url if path == "script" else path
+    etag = (await _get(client, url, "gzip")).headers["ETag"]
+
+    res = await _get(client, url, "gzip", etag=f'"stale", {etag}')
+
+    assert res.status_code == 304
+    assert res.headers["ETag"] == etag
+    assert varies_on_encoding(res)
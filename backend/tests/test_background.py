@@ -0,0 +1,36 @@
+# backend/tests/test_background.py
+import anyio
+import pytest
+
+from background import BackgroundLoop
+
+pytestmark = pytest.mark.anyio
+
+
+class Batches(BackgroundLoop):
+    def __init__(self, batches):
+        super().__init__()
+        self.batches = list(batches)
+        self.done = []
+        self.drained = False
+
+    async def step(self) -> bool:
+        if not self.batches:
+            return False
+        self.done.append(self.batches.pop(0))
+        return bool(self.batches)
+
+    async def drain(self) -> None:
+        self.drained = True
+
+
+async def test_loop_runs_full_batches_back_to_back_and_drains_on_stop():
+    loop = Batches([1, 2, 3])
+    loop.start()
+    with anyio.fail_after(1):
+        while loop.batches:
+            await anyio.sleep(0)
+    await loop.stop()
+    assert loop.done == [1, 2, 3]
+    assert loop.drained
+
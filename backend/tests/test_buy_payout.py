@@ -0,0 +1,70 @@
+# backend/tests/test_buy_payout.py
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import main
+from models import User
+from conftest import add_user
+
+pytestmark = pytest.mark.anyio
+
+
+async def _user(db_schema, user_id: int = 1) -> User:
+    async with db_schema() as db:
+        return await db.get(User, user_id)
+
+
+async def test_purchase_debits_balance_on_the_server(client, db_schema, session):
+    await add_user(session, 1, balance=25.0)
+
+    res = await client.post("/api/user/1/buy_payout")
+
+    assert res.status_code == 200
+    body = res.json()
+    assert body["balance"] == pytest.approx(15.0)
+    assert body["payout_per_cycle"] == pytest.approx(11.0)
+    user = await _user(db_schema)
+    assert (user.balance, user.payout_bonus) == (pytest.approx(15.0), 1)
+    assert user.payout_rate == pytest.approx(1.1)
+    # следующий progress-ответ отдаёт уже списанный баланс
+    assert (await client.get("/api/user_progress/1")).json()["balance"] == pytest.approx(15.0)
+
+
+async def test_insufficient_balance_is_rejected(client, db_schema, session):
+    await add_user(session, 1, balance=5.0)
+
+    res = await client.post("/api/user/1/buy_payout")
+
+    assert res.status_code == 400
+    user = await _user(db_schema)
+    assert (user.balance, user.payout_rate) == (pytest.approx(5.0), pytest.approx(1.0))
+
+
+async def test_running_timer_is_settled_before_the_check(client, db_schema, session):
+    # 1000 с при скорости 1.0 — один полный цикл (+10 ⭐) по старой выплате
+    started = datetime.now(timezone.utc) - timedelta(seconds=1000)
+    await add_user(session, 1, balance=5.0, timer_running=True, timer_started_at=started, timer_progress=0.0)
+
+    res = await client.post("/api/user/1/buy_payout")
+
+    assert res.status_code == 200
+    assert (await _user(db_schema)).balance == pytest.approx(5.0)
+
+
+async def test_buffered_fields_are_written_with_the_purchase(client, db_schema, session):
+    await add_user(session, 1, balance=10.0, level=1)
+    assert (await client.post("/api/user/1", json={"level": 3})).status_code == 200
+
+    assert (await client.post("/api/user/1/buy_payout")).status_code == 200
+
+    assert 1 not in main.user_write_buffer
+    assert (await _user(db_schema)).level == 3
+
+
+async def test_cannot_buy_for_another_user(client, session, monkeypatch):
+    monkeypatch.setattr(main.telegram_auth, "bypass", True)
+    await add_user(session, 1, balance=100.0)
+    headers = {"X-Telegram-WebApp-InitData": 'user={"id": 2}&auth_date=0&hash=test'}
+
+    assert (await client.post("/api/user/1/buy_payout", headers=headers)).status_code == 403
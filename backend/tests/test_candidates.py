@@ -0,0 +1,41 @@
+# backend/tests/test_candidates.py
+import pytest
+
+import main
+from conftest import add_user, add_slots
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_short_inventory_does_not_refill_on_every_poll(client, session):
+    queues = main.candidate_queues
+    await add_user(session, 1, current_slot_count=1)
+    await add_slots(session, 2)  # один слот займёт ячейка, в очередь попадёт только второй
+    assert (await client.get("/api/user_slots/1")).status_code == 200
+    await queues.refill()
+    assert len(queues._queues[1]) == 1 < queues.depth
+
+    for _ in range(3):
+        assert (await client.get("/api/user_slots/1")).status_code == 200
+        # ячейки заполнены, очередь не менялась — пополнять нечем
+        assert 1 not in queues._pending
+
+
+async def test_refill_resumes_when_queue_changes_or_cooldown_passes(session):
+    queues = main.candidate_queues
+    await add_user(session, 1, current_slot_count=1)
+    await add_slots(session, 1)
+    queues.request_refill(1)
+    await queues.refill()
+    assert len(queues._queues[1]) == 1
+
+    queues.request_refill(1)
+    assert 1 not in queues._pending
+
+    queues.take(1, 1, exclude=set())  # очередь изменилась
+    assert 1 in queues._pending
+    await queues.refill()
+
+    queues.refill_cooldown = 0
+    queues.request_refill(1)
+    assert 1 in queues._pending
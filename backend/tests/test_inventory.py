@@ -0,0 +1,24 @@
+# backend/tests/test_inventory.py
+from inventory import SlotInventory, STANDARD
+
+
+def test_sample_ignores_excluded_ids_of_other_buckets():
+    inventory = SlotInventory()
+    for slot_id in range(1, 11):
+        inventory.add(slot_id, STANDARD)
+    # id VIP-корзины и уже удалённых слотов не уменьшают число доступных в standard
+    exclude = set(range(100, 120)) | {1}
+
+    picked = inventory.sample(STANDARD, 3, exclude=exclude)
+
+    assert len(picked) == len(set(picked)) == 3
+    assert 1 not in picked
+
+
+def test_sample_never_returns_more_than_k():
+    inventory = SlotInventory()
+    for slot_id in range(1, 6):
+        inventory.add(slot_id, STANDARD)
+
+    assert len(inventory.sample(STANDARD, 2, exclude={1, 2})) == 2
+    assert sorted(inventory.sample(STANDARD, 10, exclude={1})) == [2, 3, 4, 5]
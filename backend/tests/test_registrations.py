@@ -0,0 +1,62 @@
+# backend/tests/test_registrations.py
+import json
+import urllib.parse
+
+import pytest
+
+import main
+from models import User
+from cache import user_cache
+from conftest import add_user
+
+pytestmark = pytest.mark.anyio
+
+
+def init_data(user: dict) -> dict:
+    query = urllib.parse.urlencode({"user": json.dumps(user), "auth_date": "0", "hash": "test"})
+    return {"X-Telegram-WebApp-InitData": query}
+
+
+@pytest.fixture(autouse=True)
+def bypass_auth(monkeypatch):
+    monkeypatch.setattr(main.telegram_auth, "bypass", True)
+
+
+async def test_get_or_create_creates_once(session):
+    user, created = await user_cache.get_or_create(session, 7, username="alice")
+    assert created and user.username == "alice"
+
+    user_cache.invalidate(7)  # второй вызов идёт в БД, а не в кэш
+    again, created = await user_cache.get_or_create(session, 7, username="bob")
+    assert not created
+    assert again.username == "alice"
+
+
+async def test_root_registers_user_in_background(client, session):
+    res = await client.get("/", headers=init_data({"id": 5, "username": "neo", "first_name": "Thomas"}))
+    assert res.status_code == 200
+    assert await session.get(User, 5) is None  # GET / в БД не ходит
+
+    assert await main.user_registrations.flush() == 1
+
+    user = await session.get(User, 5)
+    assert (user.username, user.first_name) == ("neo", "Thomas")
+
+
+async def test_registration_fills_only_missing_names(session):
+    await add_user(session, 1, username=None, first_name="Kept")
+    main.user_registrations.schedule(1, username="filled", first_name="Ignored")
+
+    await main.user_registrations.flush()
+
+    session.expire_all()
+    user = await session.get(User, 1)
+    assert (user.username, user.first_name) == ("filled", "Kept")
+
+
+async def test_root_skips_registration_for_cached_user(client, session):
+    await user_cache.get_or_create(session, 3)
+
+    await client.get("/", headers=init_data({"id": 3, "username": "cached"}))
+
+    assert len(main.user_registrations) == 0
@@ -0,0 +1,99 @@
+# backend/tests/test_show_counter.py
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+import counters
+from counters import ShowCounter
+from models import PurchasedAdSlot, UserSlot
+from conftest import add_user, add_slots
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def holders(session):
+    """Слот на 3 показа и четыре держателя с active UserSlot."""
+    slot = (await add_slots(session, 1, required_shows=3))[0]
+    user_slots = []
+    for user_id in range(1, 5):
+        await add_user(session, user_id)
+        user_slot = UserSlot(user_id=user_id, slot_id=slot.id, status="active")
+        session.add(user_slot)
+        user_slots.append(user_slot)
+    await session.commit()
+    return slot, user_slots
+
+
+async def _state(db_schema, slot_id: int):
+    async with db_schema() as db:
+        slot = await db.get(PurchasedAdSlot, slot_id)
+        res = await db.execute(select(UserSlot.user_id, UserSlot.status).where(UserSlot.slot_id == slot_id))
+        return slot.current_shows, slot.status, sorted(res.all())
+
+
+def _hot_counter(db_schema, completed):
+    return ShowCounter(db_schema, write_combining=True, flush_interval=0, hot_threshold=0,
+                       on_completing=completed.append)
+
+
+async def test_repeated_subscription_is_counted_once(client, db_schema, holders):
+    slot, user_slots = holders
+    payload = {"user_id": 1, "slot_id": slot.id}
+
+    assert (await client.post("/api/subscribe_slot", json=payload)).json()["status"] == "subscribed"
+    assert (await client.post("/api/subscribe_slot", json=payload)).json()["status"] == "already processed"
+
+    shows, status, _ = await _state(db_schema, slot.id)
+    assert (shows, status) == (1, "active")
+
+
+async def test_flush_commits_subscription_with_the_show(db_schema, holders):
+    slot, user_slots = holders
+    counter = _hot_counter(db_schema, [])
+
+    async with db_schema() as db:
+        results = await asyncio.gather(
+            counter.record(db, slot.id, user_slots[0].id),
+            counter.record(db, slot.id, user_slots[0].id),  # повтор той же подписки
+        )
+
+    assert sorted(results, key=lambda r: r is None) == [counters.ShowResult("active", False), None]
+    shows, _, statuses = await _state(db_schema, slot.id)
+    assert shows == 1
+    assert (1, "subscribed") in statuses
+
+
+async def test_flush_schedules_completion_even_if_waiters_are_gone(db_schema, holders):
+    slot, user_slots = holders
+    completed = []
+    counter = _hot_counter(db_schema, completed)
+
+    async with db_schema() as db:
+        waiters = [asyncio.ensure_future(counter.record(db, slot.id, us.id)) for us in user_slots[:3]]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()  # клиенты отвалились до flush
+        await counter.close()
+
+    assert completed == [slot.id]
+    shows, status, _ = await _state(db_schema, slot.id)
+    assert (shows, status) == (3, "completing")
+
+
+async def test_failed_flush_rolls_back_subscriptions(db_schema, holders, monkeypatch):
+    slot, user_slots = holders
+    counter = _hot_counter(db_schema, [])
+
+    def broken(slot_id, n=1):
+        raise RuntimeError("db went away")
+
+    monkeypatch.setattr(counters, "increment_shows_stmt", broken)
+    async with db_schema() as db:
+        with pytest.raises(RuntimeError):
+            await counter.record(db, slot.id, user_slots[0].id)
+
+    shows, _, statuses = await _state(db_schema, slot.id)
+    assert shows == 0
+    assert (1, "active") in statuses  # повтор запроса засчитает показ один раз
@@ -0,0 +1,74 @@
+# backend/tests/test_slot_import.py
+import json
+
+import pytest
+from sqlalchemy import func, select
+
+from models import PurchasedAdSlot
+from inventory import slot_inventory
+import main
+
+pytestmark = pytest.mark.anyio
+
+
+def _slot(i: int, **fields) -> dict:
+    return {"advertiser_id": 1, "channel_username": f"bulk_{i}", "channel_name": f"Bulk {i}",
+            "required_shows": 10, **fields}
+
+
+async def _slot_count(session) -> int:
+    return (await session.execute(select(func.count()).select_from(PurchasedAdSlot))).scalar()
+
+
+async def test_json_array_in_batches(client, session, monkeypatch):
+    monkeypatch.setattr(main, "SLOT_BULK_BATCH", 2)
+    res = await client.post("/api/slots/bulk", json=[_slot(i, slot_type="vip" if i == 0 else "standard")
+                                                     for i in range(5)])
+
+    assert res.status_code == 200
+    body = res.json()
+    assert body["count"] == 5
+    rows = (await session.execute(select(PurchasedAdSlot).order_by(PurchasedAdSlot.id))).scalars().all()
+    # id возвращаются в порядке входного массива
+    assert body["slot_ids"] == [row.id for row in rows]
+    assert [row.channel_username for row in rows] == [f"bulk_{i}" for i in range(5)]
+    assert rows[0].slot_type == "vip" and rows[0].status == "active" and rows[0].price_paid == 0
+    assert all(slot_id in slot_inventory for slot_id in body["slot_ids"])
+
+
+async def test_ndjson_stream(client, session):
+    body = "\n".join(json.dumps(_slot(i)) for i in range(3)) + "\n\n"
+    res = await client.post("/api/slots/bulk", content=body.encode(),
+                            headers={"Content-Type": "application/x-ndjson"})
+    assert res.status_code == 200
+    assert res.json()["count"] == 3
+    assert await _slot_count(session) == 3
+
+
+async def test_invalid_slot_rolls_back_everything(client, session, monkeypatch):
+    monkeypatch.setattr(main, "SLOT_BULK_BATCH", 2)
+    payload = [_slot(0), _slot(1), _slot(2), _slot(3, required_shows=0)]
+    res = await client.post("/api/slots/bulk", json=payload)
+
+    assert res.status_code == 422
+    assert res.json()["detail"]["index"] == 3
+    assert await _slot_count(session) == 0  # первая пачка уже была вставлена — откатилась вместе со всем
+
+
+async def test_invalid_ndjson_line(client, session):
+    res = await client.post("/api/slots/bulk", content=b'{"channel_username": "a"}\nnot json\n',
+                            headers={"Content-Type": "application/x-ndjson"})
+    assert res.status_code == 422
+    assert res.json()["detail"] == {"index": 1, "error": "invalid JSON"}
+
+
+async def test_request_size_limit(client, session, monkeypatch):
+    monkeypatch.setattr(main, "SLOT_BULK_MAX", 2)
+    res = await client.post("/api/slots/bulk", json=[_slot(i) for i in range(3)])
+    assert res.status_code == 413
+    assert await _slot_count(session) == 0
+
+
+async def test_non_array_body(client, session):
+    res = await client.post("/api/slots/bulk", json={"channel_username": "a"})
+    assert res.status_code == 400
@@ -0,0 +1,77 @@
+# backend/tests/test_slot_versions.py
+import json
+import urllib.parse
+
+import pytest
+
+import main
+from models import UserSlot
+from conftest import add_user, add_slots
+
+pytestmark = pytest.mark.anyio
+
+ADVERTISER = 99
+
+
+def init_data(user_id: int) -> dict:
+    # TELEGRAM_AUTH_BYPASS: подпись не проверяется, но hash обязан быть
+    query = urllib.parse.urlencode({"user": json.dumps({"id": user_id}), "auth_date": "0", "hash": "test"})
+    return {"X-Telegram-WebApp-InitData": query}
+
+
+@pytest.fixture
+async def holder(session, monkeypatch):
+    monkeypatch.setattr(main.telegram_auth, "bypass", True)
+    await add_user(session, 1, current_slot_count=2)
+    slots = await add_slots(session, 2, advertiser_id=ADVERTISER)
+    session.add_all(UserSlot(user_id=1, slot_id=slot.id, status="subscribed") for slot in slots)
+    await session.commit()
+    return slots
+
+
+async def test_unchanged_slots_answer_304(client, holder):
+    first = await client.get("/api/user_slots/1")
+    etag = first.headers["ETag"]
+
+    again = await client.get("/api/user_slots/1", headers={"If-None-Match": etag})
+
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+
+
+async def test_deleting_a_held_slot_invalidates_holders_etag(client, holder):
+    etag = (await client.get("/api/user_slots/1")).headers["ETag"]
+
+    res = await client.delete(f"/api/slot/{holder[0].id}", headers=init_data(ADVERTISER))
+    assert res.json() == {"status": "deleted"}
+    after = await client.get("/api/user_slots/1", headers={"If-None-Match": etag})
+
+    assert after.status_code == 200
+    assert [view["slot_id"] for view in after.json()] == [holder[1].id]
+
+
+async def test_delta_reports_deleted_slot(client, holder):
+    version = (await client.get("/api/user_slots/1", params={"since": 0})).json()["version"]
+
+    await client.delete(f"/api/slot/{holder[0].id}", headers=init_data(ADVERTISER))
+    delta = (await client.get("/api/user_slots/1", params={"since": version})).json()
+
+    assert delta["full"] is False
+    assert delta["removed"] == [holder[0].id]
+    assert delta["changed"] == []
+
+
+async def test_full_and_delta_responses_have_distinct_etags(client, holder):
+    full_etag = (await client.get("/api/user_slots/1")).headers["ETag"]
+    version = (await client.get("/api/user_slots/1", params={"since": 0})).json()["version"]
+    delta = await client.get("/api/user_slots/1", params={"since": version})
+    assert delta.headers["ETag"] != full_etag
+
+    # ETag полного списка не подтверждает дельту, и наоборот
+    res = await client.get("/api/user_slots/1", params={"since": version}, headers={"If-None-Match": full_etag})
+    assert res.status_code == 200
+    res = await client.get("/api/user_slots/1", headers={"If-None-Match": delta.headers["ETag"]})
+    assert res.status_code == 200
+
+    res = await client.get("/api/user_slots/1", params={"since": version}, headers={"If-None-Match": delta.headers["ETag"]})
+    assert res.status_code == 304
@@ -0,0 +1,31 @@
+# backend/tests/test_startup.py
+import asyncio
+import logging
+import subprocess
+import sys
+
+import pytest
+
+from conftest import BACKEND_DIR
+from startup import log_task_failure
+
+pytestmark = pytest.mark.anyio
+
+
+def test_startup_module_does_not_import_alembic():
+    code = "import sys, startup; sys.exit('alembic' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR).returncode == 0
+
+
+async def test_failed_background_task_is_logged(caplog):
+    async def sync_webhook():
+        raise RuntimeError("telegram is down")
+
+    task = asyncio.create_task(sync_webhook(), name="telegram-webhook")
+    task.add_done_callback(log_task_failure)
+    with caplog.at_level(logging.ERROR, logger="startup"):
+        await asyncio.wait([task])
+        await asyncio.sleep(0)  # done-callback выполняется следующим шагом цикла
+
+    assert "Background task telegram-webhook failed" in caplog.text
+    assert "telegram is down" in caplog.text
@@ -0,0 +1,55 @@
+# backend/tests/test_subscriptions.py
+import pytest
+from sqlalchemy import select
+
+import main
+from models import UserSlot, UserSubscribedChannel
+from candidates import pick_slots_for_user
+from exclusions import channel_exclusions
+from conftest import add_user, add_slots
+
+pytestmark = pytest.mark.anyio
+
+
+async def _subscribe(client, user_id: int, slot_id: int):
+    res = await client.post("/api/subscribe_slot", json={"user_id": user_id, "slot_id": slot_id})
+    assert res.status_code == 200
+    return res.json()
+
+
+@pytest.fixture
+async def subscriber(session):
+    await add_user(session, 1, current_slot_count=1)
+    # два слота одного канала и один другого
+    same = await add_slots(session, 2, prefix="same_", channel_username="news")
+    other = await add_slots(session, 1, prefix="other_")
+    session.add(UserSlot(user_id=1, slot_id=same[0].id, status="active"))
+    await session.commit()
+    return same, other
+
+
+async def test_subscribe_persists_channel(client, session, subscriber):
+    same, _ = subscriber
+    await channel_exclusions.get(session, 1)  # фильтр построен до подписки
+
+    assert (await _subscribe(client, 1, same[0].id))["status"] == "subscribed"
+
+    rows = (await session.execute(select(UserSubscribedChannel.channel_username))).scalars().all()
+    assert rows == ["news"]
+    # канал в фильтре подтверждается БД — не ложноположительный
+    assert await channel_exclusions.subscribed_among(session, 1, ["news"]) == {"news"}
+    assert channel_exclusions.false_positives == 0
+
+
+async def test_subscribed_channel_is_excluded_from_queue_and_picks(client, session, subscriber):
+    same, other = subscriber
+    await channel_exclusions.get(session, 1)
+    main.candidate_queues.request_refill(1)
+    await main.candidate_queues.refill()
+
+    await _subscribe(client, 1, same[0].id)
+
+    queued = {candidate.id for candidate in main.candidate_queues._queues[1]}
+    assert same[1].id not in queued
+    picked = await pick_slots_for_user(session, 1, 5)
+    assert [candidate.id for candidate in picked] == [other[0].id]
@@ -0,0 +1,60 @@
+# backend/tests/test_timer.py
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from models import User
+from timer import evaluate_timer, set_timer_running, settle_timer
+from conftest import add_user
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _user(**fields) -> User:
+    return User(**{"id": 1, "balance": 0.0, "timer_progress": 0.0, "timer_speed_multiplier": 1.0,
+                   "payout_rate": 1.0, **fields})
+
+
+def test_running_timer_accrues_cycles():
+    user = _user(timer_running=True, timer_started_at=T0, timer_progress=50.0)
+    state = evaluate_timer(user, T0 + timedelta(seconds=600))  # +60% прогресса
+    assert state.cycles == 1
+    assert state.progress == pytest.approx(10.0)
+    assert state.balance == pytest.approx(10.0)
+
+
+def test_settle_moves_reference_point():
+    user = _user(timer_running=True, timer_started_at=T0)
+    settle_timer(user, T0 + timedelta(seconds=1500))
+    assert user.balance == pytest.approx(10.0)
+    assert user.timer_progress == pytest.approx(50.0)
+    assert user.timer_started_at == T0 + timedelta(seconds=1500)
+
+
+def test_legacy_running_row_gets_reference_point():
+    # running=True без timer_started_at — так строки оставлял старый клиент
+    user = _user(timer_running=True, timer_started_at=None, timer_progress=42.0)
+    assert evaluate_timer(user, T0).progress == 42.0
+
+    assert set_timer_running(user, True, T0) is True
+    assert user.timer_started_at == T0
+    assert evaluate_timer(user, T0 + timedelta(seconds=10)).progress == pytest.approx(43.0)
+    assert set_timer_running(user, True, T0 + timedelta(seconds=10)) is False
+
+
+def test_stopped_timer_is_not_written():
+    user = _user(timer_running=False, timer_started_at=None)
+    assert set_timer_running(user, False, T0) is False
+    assert user.timer_started_at is None
+
+
+@pytest.mark.anyio
+async def test_slot_sync_restarts_legacy_timer(client, session):
+    await add_user(session, 1, current_slot_count=0, timer_running=True, timer_progress=42.0)
+
+    await client.get("/api/user_slots/1")
+
+    user = await session.get(User, 1, populate_existing=True)
+    assert user.timer_started_at is not None
+    later = user.timer_started_at.replace(tzinfo=timezone.utc) + timedelta(seconds=20)
+    assert evaluate_timer(user, later).progress == pytest.approx(44.0)
@@ -0,0 +1,15 @@
+# backend/tests/test_ttl_cache.py
+from ttl_cache import TTLCache
+
+
+def test_ttl_cache_expires_and_evicts_lru():
+    now = [0.0]
+    cache = TTLCache(2, ttl=10, clock=lambda: now[0])
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # вытесняет "b" — к "a" только что обращались
+    assert "b" not in cache and cache.get("a") == 1
+    now[0] = 11
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,54 @@
+# backend/tests/test_user_cache.py
+import pytest
+from sqlalchemy import update
+
+from models import User, UserSlot
+from cache import user_cache
+from conftest import add_user, add_slots
+
+pytestmark = pytest.mark.anyio
+
+
+async def _other_worker_sets_balance(session, user_id: int, balance: float) -> None:
+    # запись в обход кэша этого процесса — как из другого воркера
+    await session.execute(update(User).where(User.id == user_id).values(balance=balance))
+    await session.commit()
+
+
+async def _balance(session, user_id: int) -> float:
+    return (await session.get(User, user_id, populate_existing=True)).balance
+
+
+async def test_reads_are_served_from_cache(client, session, count_queries):
+    await add_user(session, 1)
+    await client.get("/api/user/1")
+    with count_queries() as statements:
+        assert (await client.get("/api/user/1")).status_code == 200
+    assert statements == []
+
+
+async def test_settling_write_rereads_the_row(client, session):
+    await add_user(session, 1)
+    await client.get("/api/user/1")  # снимок в кэше
+    await _other_worker_sets_balance(session, 1, 500.0)
+
+    assert (await client.post("/api/user/1", json={"payout_rate": 2.0})).status_code == 200
+
+    user = await session.get(User, 1, populate_existing=True)
+    assert (user.balance, user.payout_rate) == (500.0, 2.0)
+    assert user_cache._snapshots.peek(1)["balance"] == 500.0
+
+
+async def test_subscribe_does_not_overwrite_concurrent_balance(client, session):
+    await add_user(session, 1, current_slot_count=1)
+    slot, = await add_slots(session, 1)
+    session.add(UserSlot(user_id=1, slot_id=slot.id, status="active"))
+    await session.commit()
+    await client.get("/api/user_slots/1")
+    await _other_worker_sets_balance(session, 1, 250.0)
+
+    res = await client.post("/api/subscribe_slot", json={"user_id": 1, "slot_id": slot.id})
+
+    assert res.json()["timer_running"] is True
+    assert await _balance(session, 1) == 250.0
+
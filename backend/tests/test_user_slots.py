@@ -0,0 +1,59 @@
+# backend/tests/test_user_slots.py
+import pytest
+
+from models import UserSlot
+from conftest import add_user, add_slots
+
+pytestmark = pytest.mark.anyio
+
+
+async def _hold(db, user_id: int, slots, status: str = "subscribed") -> None:
+    db.add_all(UserSlot(user_id=user_id, slot_id=slot.id, status=status) for slot in slots)
+    await db.commit()
+
+
+@pytest.mark.parametrize("held", [1, 20])
+async def test_user_slots_response_shape(client, session, held):
+    await add_user(session, 1, current_slot_count=held)
+    slots = await add_slots(session, held)
+    await _hold(session, 1, slots)
+
+    res = await client.get("/api/user_slots/1")
+
+    assert res.status_code == 200
+    body = res.json()
+    assert [view["slot_id"] for view in body] == sorted(slot.id for slot in slots)
+    assert body[0] == {
+        "slot_id": slots[0].id, "title": slots[0].channel_name, "link": slots[0].link,
+        "type": "standard", "status": "subscribed",
+    }
+
+
+async def _statements_for(client, session, count_queries, user_id: int, held: int) -> int:
+    await add_user(session, user_id, current_slot_count=held)
+    await _hold(session, user_id, await add_slots(session, held, prefix=f"u{user_id}_"))
+    with count_queries() as statements:
+        res = await client.get(f"/api/user_slots/{user_id}")
+    assert res.status_code == 200 and len(res.json()) == held
+    return len(statements)
+
+
+async def test_user_slots_query_count_does_not_grow_with_slots(client, session, count_queries):
+    # N+1: раньше каждый UserSlot дочитывал свой PurchasedAdSlot отдельным запросом
+    assert await _statements_for(client, session, count_queries, 1, 1) == \
+        await _statements_for(client, session, count_queries, 2, 20)
+
+
+async def _assign_statements(client, session, count_queries, user_id: int, need: int) -> int:
+    await add_user(session, user_id, current_slot_count=need)
+    with count_queries() as statements:
+        res = await client.get(f"/api/user_slots/{user_id}")
+    assert res.status_code == 200 and len(res.json()) == need
+    return len(statements)
+
+
+async def test_assignment_query_count_does_not_grow_with_need(client, session, count_queries):
+    await add_slots(session, 200)
+    # после назначения ответ собирается без повторного SELECT текущих слотов
+    assert await _assign_statements(client, session, count_queries, 1, 1) == \
+        await _assign_statements(client, session, count_queries, 2, 20)
@@ -0,0 +1,88 @@
+# backend/tests/test_write_buffer.py
+import pytest
+
+from models import User
+from write_buffer import UserFieldError, coerce_user_fields
+from conftest import add_user
+import main
+
+pytestmark = pytest.mark.anyio
+
+
+def test_coerce_user_fields():
+    assert coerce_user_fields({"level": 7.0, "payout_rate": "1.5", "balance": 100, "unknown": 1}) == {
+        "level": 7, "payout_rate": 1.5,
+    }
+    for bad in ({"level": {"x": 1}}, {"level": True}, {"level": 1.5}, {"free_points": "many"},
+                {"payout_rate": float("inf")}, {"level": None}):
+        with pytest.raises(UserFieldError):
+            coerce_user_fields(bad)
+    with pytest.raises(UserFieldError):
+        coerce_user_fields([1, 2])
+
+
+async def _level(session, user_id: int) -> int:
+    return (await session.get(User, user_id, populate_existing=True)).level
+
+
+async def test_saves_are_coalesced_into_one_flush(client, session):
+    await add_user(session, 1)
+    await add_user(session, 2)
+    assert (await client.post("/api/user/1", json={"level": 2})).status_code == 200
+    assert (await client.post("/api/user/1", json={"free_points": 3})).status_code == 200
+    assert (await client.post("/api/user/2", json={"level": 5})).status_code == 200
+
+    # read-your-writes до flush
+    assert (await client.get("/api/user/1")).json()["level"] == 2
+    assert await main.user_write_buffer.flush() == 2
+
+    user = await session.get(User, 1, populate_existing=True)
+    assert (user.level, user.free_points) == (2, 3)
+    assert await _level(session, 2) == 5
+
+
+async def test_settling_save_writes_buffered_fields(client, session):
+    await add_user(session, 1, level=1)
+    assert (await client.post("/api/user/1", json={"level": 4})).status_code == 200
+    assert (await client.post("/api/user/1", json={"payout_rate": 1.5})).status_code == 200
+
+    assert 1 not in main.user_write_buffer
+    assert await _level(session, 1) == 4
+
+
+async def test_malformed_save_is_rejected(client, session):
+    await add_user(session, 1)
+    res = await client.post("/api/user/1", json={"level": {"x": 1}})
+    assert res.status_code == 422
+    assert res.json()["detail"]["field"] == "level"
+    assert 1 not in main.user_write_buffer
+
+
+async def test_bad_row_does_not_block_the_batch(session):
+    await add_user(session, 1)
+    await add_user(session, 2)
+    buffer = main.user_write_buffer
+    # в обход save_user: значение, которое БД не примет
+    buffer.put(1, {"level": {"x": 1}})
+    buffer.put(2, {"level": 7})
+
+    assert await buffer.flush() == 1
+    assert await _level(session, 2) == 7
+    assert await _level(session, 1) == 1
+    assert len(buffer) == 0  # плохая строка выброшена, а не повторяется вечно
+
+
+async def test_failed_flush_is_requeued_until_max_attempts(session, monkeypatch):
+    await add_user(session, 1)
+    buffer = main.user_write_buffer
+    monkeypatch.setattr(buffer, "max_attempts", 2)
+
+    async def unavailable(rows):
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(buffer, "_write", unavailable)
+    buffer.put(1, {"level": 3})
+    assert await buffer.flush() == 0
+    assert 1 in buffer  # БД недоступна — строка ждёт следующего flush
+    assert await buffer.flush() == 0
+    assert 1 not in buffer
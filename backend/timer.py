@@ -0,0 +1,99 @@
+# backend/timer.py
+import os
+import math
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+
+from models import User
+
+# Те же константы, что были в startTimer (static/script.js):
+# +0.1% прогресса в секунду при timer_speed_multiplier = 1.0, 10 ⭐ * payout_rate за цикл
+PROGRESS_PER_SECOND = 0.1
+CYCLE_PROGRESS = 100.0
+CYCLE_REWARD = 10.0
+# Покупка "+1 ⭐ за цикл" на главной (кнопка buyPayout); цена — только серверная
+PAYOUT_UPGRADE_COST = float(os.getenv("PAYOUT_UPGRADE_COST", "10"))  # ⭐
+
+
+class TimerState(NamedTuple):
+    progress: float  # 0..100 внутри текущего цикла
+    running: bool
+    cycles: int  # циклы, завершившиеся с момента последнего settle
+    balance: float  # balance с учётом этих циклов
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def evaluate_timer(user: User, now: Optional[datetime] = None) -> TimerState:
+    """Ленивая оценка таймера: ничего не пишет, только считает от timer_started_at."""
+    base = user.timer_progress or 0.0
+    balance = user.balance or 0.0
+    if not user.timer_running or user.timer_started_at is None:
+        return TimerState(base, bool(user.timer_running), 0, balance)
+
+    now = now or datetime.now(timezone.utc)
+    elapsed = max(0.0, (now - _as_utc(user.timer_started_at)).total_seconds())
+    total = base + elapsed * PROGRESS_PER_SECOND * (user.timer_speed_multiplier or 1.0)
+    cycles = int(total // CYCLE_PROGRESS)
+    progress = math.fmod(total, CYCLE_PROGRESS)
+    return TimerState(progress, True, cycles, balance + cycles * CYCLE_REWARD * (user.payout_rate or 1.0))
+
+
+def settle_timer(user: User, now: Optional[datetime] = None) -> TimerState:
+    """Зафиксировать накопленное в строке: зачислить циклы и перенести точку отсчёта на now.
+
+    Вызывается перед любым изменением входов таймера (запуск/остановка, скорость, выплата).
+    """
+    now = now or datetime.now(timezone.utc)
+    state = evaluate_timer(user, now)
+    user.timer_progress = state.progress
+    user.balance = state.balance
+    if state.running:
+        user.timer_started_at = now
+    return state
+
+
+def buy_payout_upgrade(user: User, now: Optional[datetime] = None) -> bool:
+    """Списать PAYOUT_UPGRADE_COST и поднять выплату за цикл на 1 ⭐; False — звёзд не хватает.
+
+    Сначала settle_timer: циклы, набежавшие по старой выплате, зачисляются до проверки баланса.
+    """
+    settle_timer(user, now)
+    if (user.balance or 0.0) < PAYOUT_UPGRADE_COST:
+        return False
+    user.balance -= PAYOUT_UPGRADE_COST
+    user.payout_bonus = (user.payout_bonus or 0) + 1
+    user.payout_rate = round((user.payout_rate or 1.0) + 1 / CYCLE_REWARD, 4)
+    return True
+
+
+def timer_switch_needed(user: User, running: bool) -> bool:
+    """Изменит ли set_timer_running(user, running) строку — проверка без записи."""
+    # running без точки отсчёта — строка со старого клиента, без неё таймер стоит на месте
+    return bool(user.timer_running) != running or (running and user.timer_started_at is None)
+
+
+def set_timer_running(user: User, running: bool, now: Optional[datetime] = None) -> bool:
+    """Переключить таймер; возвращает True, если строку нужно сохранить."""
+    if not timer_switch_needed(user, running):
+        return False
+    now = now or datetime.now(timezone.utc)
+    if bool(user.timer_running) == running:
+        user.timer_started_at = now
+        return True
+    settle_timer(user, now)
+    user.timer_running = running
+    user.timer_started_at = now if running else None
+    return True
+
+
+def timer_view(user: User, now: Optional[datetime] = None) -> dict:
+    state = evaluate_timer(user, now)
+    return {
+        "timer_progress": state.progress,
+        "timer_running": state.running,
+        "balance": state.balance,
+        "cycles": state.cycles,
+    }
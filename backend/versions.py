@@ -0,0 +1,111 @@
+# backend/versions.py
+import os
+import time
+import uuid
+import itertools
+from typing import Dict, List, Optional
+
+from ttl_cache import TTLCache
+
+STATE_VERSIONS_SIZE = int(os.getenv("STATE_VERSIONS_SIZE", "50000"))  # пользователей
+# Версии локальны для процесса: изменения, сделанные другим воркером, сюда не доходят.
+# Поэтому 304 отдаётся не дольше этого окна после последнего полного ответа.
+STATE_VERSION_MAX_AGE = float(os.getenv("STATE_VERSION_MAX_AGE", "30"))  # секунды
+
+SLOTS = "slots"
+PROGRESS = "progress"
+
+
+class _State:
+    __slots__ = ("version", "snapshot_version", "snapshot", "cacheable_until")
+
+    def __init__(self, version: int):
+        self.version = version
+        self.snapshot_version: Optional[int] = None
+        self.snapshot: Optional[Dict[int, dict]] = None
+        self.cacheable_until = 0.0
+
+
+class StateVersions:
+    """Монотонные версии состояния пользователя (слоты / прогресс) для ETag, 304 и дельт.
+
+    Версию поднимает любое событие "slots"/"progress" шины событий (подписка,
+    назначение, completing/completed) и сохранение пользователя. Полный ответ
+    запоминает версию, на которой он был посчитан; если с тех пор ничего не
+    поднималось, следующий poll с тем же If-None-Match получает 304 без БД.
+    """
+
+    def __init__(self, maxsize: int = STATE_VERSIONS_SIZE, max_age: float = STATE_VERSION_MAX_AGE):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        # эпоха в ETag: после рестарта старые ETag клиентов не совпадут ни с чем
+        self.epoch = uuid.uuid4().hex[:8]
+        self._counter = itertools.count(1)
+        # версии не истекают, только вытесняются по LRU
+        self._states: Dict[str, TTLCache[_State]] = {SLOTS: TTLCache(maxsize), PROGRESS: TTLCache(maxsize)}
+
+    def _state(self, kind: str, user_id: int) -> _State:
+        states = self._states[kind]
+        state = states.get(user_id)
+        if state is None:
+            state = _State(next(self._counter))
+            states.put(user_id, state)
+        return state
+
+    def current(self, kind: str, user_id: int) -> int:
+        """Версия до чтения из БД — передаётся потом в remember()."""
+        return self._state(kind, user_id).version
+
+    def bump(self, kind: str, user_id: int) -> None:
+        state = self._states[kind].peek(user_id)
+        if state is not None:
+            state.version = next(self._counter)
+
+    def bump_all(self, user_id: int) -> None:
+        for kind in self._states:
+            self.bump(kind, user_id)
+
+    def observe(self, user_id: int, event: dict) -> None:
+        if event.get("type") in self._states:
+            self.bump(event["type"], user_id)
+
+    def etag(self, kind: str, version: int, since: Optional[int] = None) -> str:
+        # ?since=<v> — другое представление (дельта), и ETag у него свой для каждого since
+        variant = f"-{since}" if since is not None else ""
+        return f'W/"{kind[0]}{self.epoch}.{version}{variant}"'
+
+    def cached_etag(self, kind: str, user_id: int, since: Optional[int] = None) -> Optional[str]:
+        """ETag последнего полного ответа, если он всё ещё актуален (иначе None — надо идти в БД)."""
+        state = self._states[kind].peek(user_id)
+        if state is None or state.snapshot_version != state.version or state.cacheable_until < time.monotonic():
+            return None
+        return self.etag(kind, state.version, since)
+
+    def remember(self, kind: str, user_id: int, version: int, cacheable: bool,
+                 views: Optional[List[dict]] = None, key: str = "slot_id") -> Optional[int]:
+        """Запомнить полный ответ, посчитанный на версии version; вернуть её, если она ещё текущая."""
+        state = self._state(kind, user_id)
+        if state.version != version:
+            return None  # за время запроса состояние поменялось — этот ответ не кэшируем
+        state.snapshot_version = version
+        state.snapshot = {view[key]: view for view in views} if views is not None else None
+        state.cacheable_until = time.monotonic() + self.max_age if cacheable else 0.0
+        return version
+
+    def delta(self, kind: str, user_id: int, since: int, views: List[dict], key: str = "slot_id") -> Optional[dict]:
+        """Изменения относительно снимка версии since; None — снимка нет, нужен полный ответ."""
+        state = self._states[kind].peek(user_id)
+        if state is None or state.snapshot is None or state.snapshot_version != since:
+            return None
+        previous = state.snapshot
+        current = {view[key]: view for view in views}
+        return {
+            "changed": [view for k, view in current.items() if previous.get(k) != view],
+            "removed": [k for k in previous if k not in current],
+        }
+
+    def stats(self) -> Dict[str, int]:
+        return {kind: len(states) for kind, states in self._states.items()}
+
+
+state_versions = StateVersions()
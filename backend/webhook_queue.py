@@ -0,0 +1,105 @@
+# backend/webhook_queue.py
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_DEDUP_SIZE = int(os.getenv("WEBHOOK_DEDUP_SIZE", "10000"))  # сколько последних update_id помним
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "10"))  # секунды на дослив при остановке
+
+QUEUED = "queued"
+DUPLICATE = "duplicate"
+REJECTED = "rejected"
+
+webhook_updates = metrics.register(metrics.Counter("webhook_updates_total", "Webhook updates by result."))
+webhook_queue_depth = metrics.register(metrics.Gauge("webhook_queue_depth", "Updates waiting for a worker."))
+webhook_processing = metrics.register(metrics.Histogram(
+    "webhook_processing_seconds", "Time spent processing one update.", metrics.LATENCY_BUCKETS
+))
+webhook_queue_wait = metrics.register(metrics.Histogram(
+    "webhook_queue_wait_seconds", "Time an update spent in the queue.", metrics.LATENCY_BUCKETS
+))
+
+
+class UpdateQueue:
+    """Очередь апдейтов Telegram: /webhook кладёт и сразу отвечает, обработку делают воркеры.
+
+    Telegram повторяет доставку при таймауте/ошибке, поэтому update_id дедуплицируются.
+    Когда очередь полна, апдейт не запоминается — вызывающий отвечает 503 и Telegram пришлёт его снова.
+    """
+
+    def __init__(self, processor: Callable[[object], Awaitable[None]], maxsize: int = WEBHOOK_QUEUE_SIZE,
+                 workers: int = WEBHOOK_WORKERS, dedup_size: int = WEBHOOK_DEDUP_SIZE):
+        self._processor = processor
+        self.maxsize = maxsize
+        self.workers = workers
+        self.dedup_size = dedup_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+        self._tasks: List[asyncio.Task] = []
+
+    def __len__(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def _remember(self, update_id: int) -> bool:
+        if update_id in self._seen:
+            self._seen.move_to_end(update_id)
+            return False
+        self._seen[update_id] = None
+        if len(self._seen) > self.dedup_size:
+            self._seen.popitem(last=False)
+        return True
+
+    def submit(self, update_id: Optional[int], update) -> str:
+        if self._queue is None or self._queue.full():
+            webhook_updates.inc(result=REJECTED)
+            return REJECTED
+        if update_id is not None and not self._remember(update_id):
+            webhook_updates.inc(result=DUPLICATE)
+            return DUPLICATE
+        self._queue.put_nowait((time.perf_counter(), update))
+        webhook_updates.inc(result=QUEUED)
+        webhook_queue_depth.set(self._queue.qsize())
+        return QUEUED
+
+    async def _worker(self) -> None:
+        while True:
+            enqueued_at, update = await self._queue.get()
+            started = time.perf_counter()
+            webhook_queue_wait.observe(started - enqueued_at)
+            try:
+                await self._processor(update)
+            except Exception:
+                logger.exception("Webhook update processing failed")
+            finally:
+                webhook_processing.observe(time.perf_counter() - started)
+                webhook_queue_depth.set(self._queue.qsize())
+                self._queue.task_done()
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = WEBHOOK_DRAIN_TIMEOUT) -> None:
+        """Дослить очередь (не дольше timeout), затем остановить воркеры."""
+        if not self._tasks:
+            return
+        queue, self._queue = self._queue, None  # новые апдейты больше не принимаем
+        try:
+            await asyncio.wait_for(queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Webhook queue drain timed out, %s updates dropped", queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,172 @@
+# backend/write_buffer.py
+import os
+import math
+import asyncio
+import logging
+from typing import Dict, List
+
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import User
+from background import BackgroundLoop
+
+logger = logging.getLogger(__name__)
+
+USER_FLUSH_INTERVAL = float(os.getenv("USER_FLUSH_INTERVAL", "0.5"))  # секунды
+USER_FLUSH_MAX_PENDING = int(os.getenv("USER_FLUSH_MAX_PENDING", "500"))  # пользователей в буфере
+# сколько flush подряд строка может не записаться (БД недоступна), прежде чем её выбросить
+USER_FLUSH_MAX_ATTEMPTS = int(os.getenv("USER_FLUSH_MAX_ATTEMPTS", "20"))
+
+# поля, которые клиент пишет через POST /api/user/{id}, и их типы
+USER_FIELD_TYPES = {
+    "level": int,
+    "free_points": int,
+    "distributed_points": int,
+    "payout_bonus": int,
+    "ref_points": int,
+    "current_boost_level": int,
+    "current_checkpoint": int,
+    "current_slot_count": int,
+    "checkpoint_progress": float,
+    "timer_speed_multiplier": float,
+    "payout_rate": float,
+}
+
+
+class UserFieldError(ValueError):
+    def __init__(self, field: str, message: str):
+        super().__init__(f"{field}: {message}")
+        self.field = field
+        self.message = message
+
+
+def _coerce(field: str, kind: type, value):
+    # bool — подкласс int, но "level": true это ошибка клиента, а не 1
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise UserFieldError(field, f"expected a number, got {type(value).__name__}")
+    try:
+        number = float(value)
+    except ValueError:
+        raise UserFieldError(field, "expected a number")
+    if not math.isfinite(number):
+        raise UserFieldError(field, "must be finite")
+    if kind is int:
+        if not number.is_integer():
+            raise UserFieldError(field, "expected an integer")
+        return int(number)
+    return number
+
+
+def coerce_user_fields(payload) -> Dict[str, object]:
+    """Разрешённые поля payload, приведённые к типам колонок; лишние ключи игнорируются.
+
+    Проверка до put(): одно некорректное значение в буфере валило бы executemany всей пачки.
+    """
+    if not isinstance(payload, dict):
+        raise UserFieldError("body", "expected an object")
+    return {
+        key: _coerce(key, kind, payload[key])
+        for key, kind in USER_FIELD_TYPES.items() if key in payload
+    }
+
+
+class UserWriteBuffer(BackgroundLoop):
+    """Write-behind для POST /api/user/{id}: поля копятся по user_id и пишутся пачкой.
+
+    Последовательные сохранения одного пользователя сливаются в одну строку UPDATE,
+    а все пользователи буфера уходят одним executemany (ORM bulk UPDATE by PK).
+    """
+
+    def __init__(self, session_factory, flush_interval: float = USER_FLUSH_INTERVAL,
+                 max_pending: int = USER_FLUSH_MAX_PENDING, max_attempts: int = USER_FLUSH_MAX_ATTEMPTS):
+        super().__init__(flush_interval)
+        self._session_factory = session_factory
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self._pending: Dict[int, dict] = {}
+        self._attempts: Dict[int, int] = {}  # user_id -> неудачных flush подряд
+        # держит flush целиком — синхронные записи в обход буфера ждут его, чтобы не обогнать старые значения
+        self.lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._pending
+
+    def put(self, user_id: int, fields: dict) -> None:
+        if not fields:
+            return
+        self._pending.setdefault(user_id, {}).update(fields)
+        if len(self._pending) >= self.max_pending:
+            self.wake()  # буфер полон — не ждать интервала
+
+    def take(self, user_id: int) -> dict:
+        """Забрать несброшенные поля пользователя (вызывающий пишет их сам, под self.lock)."""
+        return self._pending.pop(user_id, {})
+
+    def apply(self, user: User) -> User:
+        """Read-your-writes: наложить несброшенные поля на загруженную строку, не помечая её dirty."""
+        for key, value in self._pending.get(user.id, {}).items():
+            set_committed_value(user, key, value)
+        return user
+
+    async def _write(self, rows: List[dict]) -> None:
+        async with self._session_factory() as db:
+            await db.execute(update(User), rows)
+            await db.commit()
+
+    def _requeue(self, pending: Dict[int, dict]) -> None:
+        # вернуть в буфер, не затирая то, что пришло во время flush
+        for user_id, fields in pending.items():
+            attempts = self._attempts.get(user_id, 0) + 1
+            if attempts >= self.max_attempts:
+                self._attempts.pop(user_id, None)
+                logger.error("User %s buffered fields dropped after %s failed flushes: %s", user_id, attempts, fields)
+                continue
+            self._attempts[user_id] = attempts
+            self._pending[user_id] = {**fields, **self._pending.get(user_id, {})}
+
+    async def flush(self) -> int:
+        async with self.lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            rows = [{"id": user_id, **fields} for user_id, fields in pending.items()]
+            try:
+                await self._write(rows)
+            except Exception:
+                logger.exception("User write-behind flush failed for %s users, retrying row by row", len(rows))
+            else:
+                self._attempts.clear()
+                return len(rows)
+
+            # одна плохая строка не должна держать всю пачку: пишем по одной
+            written = 0
+            failed: Dict[int, dict] = {}
+            for row in rows:
+                try:
+                    await self._write([row])
+                except Exception:
+                    logger.exception("User %s write-behind row failed", row["id"])
+                    failed[row["id"]] = pending[row["id"]]
+                else:
+                    written += 1
+                    self._attempts.pop(row["id"], None)
+            if written:
+                # остальные строки прошли — дело в данных этих строк, повтор не поможет
+                for user_id, fields in failed.items():
+                    self._attempts.pop(user_id, None)
+                    logger.error("User %s buffered fields dropped: %s", user_id, fields)
+            else:
+                # не прошла ни одна — похоже на недоступность БД, повторим на следующем flush
+                self._requeue(failed)
+            return written
+
+    async def step(self) -> bool:
+        await self.flush()
+        return False
+
+    async def drain(self) -> None:
+        await self.flush()